@@ -1,7 +1,21 @@
 from json import dumps, loads
 from os import path
 from krita import * # type: ignore
-from PyQt5.QtCore import QByteArray
+from PyQt5.QtCore import QByteArray, QObject, QTimer
+
+from .paletteModel import isPacked
+
+SETTINGS_PATH = path.dirname(path.realpath(__file__)) + '/userData/settings/settings.json'
+# ms of quiet after the last edit before the palette annotation is written
+DEFAULT_WRITE_DELAY = 500
+
+
+def readSettings():
+    try:
+        with open(SETTINGS_PATH) as infile:
+            return loads(infile.read())
+    except (OSError, ValueError):
+        return {}
 
 class AnnotationService():
     # wait until document is open to use service
@@ -15,22 +29,31 @@ class AnnotationService():
 
     def startup(self):
         if (self._doc and not self._palette):
-            data = self._doc.annotation(self.annotationTag).data().decode('utf8')
-            if data:
-                self._palette = loads(data)
+            self._palette = self.readAnnotation()
     
     def loadSettings(self):
         if (self._doc):
-            data = self._doc.annotation(self.annotationTag).data().decode('utf8')
-            if data:
-                self._palette = loads(data)
+            self._palette = self.readAnnotation()
 
-    def savePalette(self, palette):
+    def readAnnotation(self):
+        """
+        Palette stored in the document: packed bytes (see PaletteModel.toBytes)
+        or, for documents saved by older versions, the JSON nested lists.
+        None when the document has no palette.
+        """
+        data = self._doc.annotation(self.annotationTag).data()
+        if not data:
+            return None
+        if isPacked(data):
+            return bytes(data)
+        return loads(data.decode('utf8'))
+
+    def savePalette(self, palette: bytes):
         if (self._doc):
             self._doc.setAnnotation(
                 self.annotationTag,
                 self.annotationDescription,
-                QByteArray(dumps(palette).encode())
+                QByteArray(palette)
             )
     
     def printAnnotation(self):
@@ -63,8 +86,46 @@ class AnnotationService():
         self.defaultMode = defaultMode
         self.customSettings = customSettings
         jsonSetting = dumps(self.settings, indent=4)
-        with open(path.dirname(path.realpath(__file__)) + '/userData/settings/settings.json', "w") as outfile:
+        with open(SETTINGS_PATH, "w") as outfile:
             outfile.write(jsonSetting)
     
     def toString(self):
-        pass
\ No newline at end of file
+        pass
+
+
+class AnnotationWriter(QObject):
+    """
+    Write-behind for the palette annotation.
+
+    Edits only mark the model dirty and (re)start a single-shot timer, so a
+    burst of mixes ends in one packed model.toBytes() and one setAnnotation
+    call once the palette has been quiet for `delay` ms. flush() writes
+    immediately; the docker calls it when the pointer leaves it, on save
+    and close shortcuts and before switching documents, so a save never
+    misses a pending edit.
+    """
+
+    def __init__(self, service, model, delay=DEFAULT_WRITE_DELAY, parent=None):
+        super().__init__(parent)
+        self.service = service
+        self.model = model
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+
+    def setDelay(self, delay):
+        self.timer.setInterval(delay)
+
+    def schedule(self):
+        if self.model.dirty:
+            self.timer.start()
+
+    def discard(self):
+        self.timer.stop()
+        self.model.takeDirty()
+
+    def flush(self):
+        self.timer.stop()
+        if self.model.takeDirty():
+            self.service.savePalette(self.model.toBytes())
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+from krita import ManagedColor
+from PyQt5.QtGui import QColor
+
+
+class ColorContext:
+    """
+    The view, canvas and color space of the active document, captured once
+    per canvas change instead of looked up through Krita on every click.
+
+    ManagedColors are memoized per RGB; the memo is dropped when the
+    document's color model, depth or profile changes (see revalidate).
+    """
+
+    def __init__(self, view, maxColors=256):
+        self.view = view
+        self.canvas = view.canvas()
+        self.document = view.document()
+        self.space = self._space()
+        self.maxColors = maxColors
+        self._colors = OrderedDict()
+
+    def _space(self):
+        doc = self.document
+        return (doc.colorModel(), doc.colorDepth(), doc.colorProfile())
+
+    def revalidate(self):
+        """
+        Forget converted colors if the document changed color space.
+        """
+        space = self._space()
+        if space != self.space:
+            self.space = space
+            self._colors.clear()
+
+    def managedColor(self, rgb):
+        key = (rgb[0], rgb[1], rgb[2])
+        color = self._colors.get(key)
+        if color is None:
+            color = ManagedColor.fromQColor(QColor(*key), self.canvas)
+            self._colors[key] = color
+            if len(self._colors) > self.maxColors:
+                self._colors.popitem(last=False)
+        else:
+            self._colors.move_to_end(key)
+        return color
+
+    def foregroundRGB(self):
+        fg = self.view.foregroundColor().colorForCanvas(self.canvas)
+        return (fg.red(), fg.green(), fg.blue())
+
+    def setForeground(self, rgb):
+        self.view.setForeGroundColor(self.managedColor(rgb))
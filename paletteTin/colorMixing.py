@@ -1,29 +1,233 @@
 from .modules.spectraljs.spectral import * 
 from PyQt5.QtGui import QColor
 from .modules.oklab.oklab import *
+from .modules.transfer.transfer import encode8
+from .modules.engine.derivedColor import okhslConverter, okhslOf, reflectanceTermsOf
+from .modules.engine.engine import spectralMixBatch
 import math
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
 
 # Dictionary to store registered color mixer functions
 # Use register_mixer decorator to add more mixing functions
 # they must have baseColor [r,g,b] mixerColor [r,g,b] and mixRate
 mixingList = {}
 
-def register_mixer(name):
+# Metadata given to register_mixer, keyed by mixer name
+mixerInfo = {}
+
+# Fixed percentage of spectral in the hybrid mixers
+HYBRID_RATE = 40
+
+# Rates are quantized to this many steps before caching, so the slider's
+# whole percentages always land on the same key
+RATE_STEPS = 1000
+
+class MixCache:
+    """
+    Bounded LRU of mixer results keyed on
+    (mixer name, base RGB, mixer RGB, quantized rate).
+    Mixers also run on worker threads, so every access takes a lock.
+    """
+    def __init__(self, maxSize=512):
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxSize):
+        with self._lock:
+            self.maxSize = maxSize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxSize": self.maxSize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self):
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+mixCache = MixCache()
+
+def register_mixer(name, deterministic=True, cacheable=True, usesRate=True, batch=None):
     """
     Decorator to register a color mixer function.
     
     Args:
         name (str): Name identifier for the mixer.
+        deterministic (bool): Same inputs always give the same color.
+        cacheable (bool): Results may be served from mixCache.
+            Only honoured for deterministic mixers.
+        usesRate (bool): False if the mixer ignores mixRate, so every
+            rate shares one cache entry.
+        batch (function): Optional batch version taking lists of base
+            colors, mixer colors and rates; used by mixBatch.
         
     Returns:
-        function: Decorated function added to mixingList.
+        function: Decorated function; mixingList gets the cached wrapper.
     """
     def decorator(func):
-        mixingList[name] = func
+        mixerInfo[name] = {
+            "deterministic": deterministic,
+            "cacheable": deterministic and cacheable,
+            "usesRate": usesRate,
+            "func": func,
+            "batch": batch,
+        }
+        if mixerInfo[name]["cacheable"]:
+            mixingList[name] = cachedMixer(name, func)
+        else:
+            mixingList[name] = func
         return func
     return decorator
 
-@register_mixer("Spectral")
+def cachedMixer(name, func):
+    """
+    Wrap a mixer so results are looked up in mixCache first. The mixer is
+    called with the quantized rate so a cached entry is always exactly what
+    a fresh call would return.
+    """
+    @wraps(func)
+    def wrapper(baseColorRGB, mixerColorRGB, mixRate=None):
+        key = mixKey(name, baseColorRGB, mixerColorRGB, mixRate)
+        steps = key[3]
+        if steps is not None:
+            mixRate = steps / RATE_STEPS
+        cached = mixCache.get(key)
+        if cached is not None:
+            return list(cached)
+        mixed = func(baseColorRGB, mixerColorRGB, mixRate)
+        mixCache.put(key, tuple(mixed))
+        return mixed
+    return wrapper
+
+def mixKey(name, baseColorRGB, mixerColorRGB, mixRate):
+    steps = None
+    if mixerInfo[name]["usesRate"] and mixRate is not None:
+        steps = round(mixRate * RATE_STEPS)
+    return (name, tuple(baseColorRGB), tuple(mixerColorRGB), steps)
+
+def quickMix(name, baseColorRGB, mixerColorRGB, mixRate):
+    """
+    Mix without blocking: a cached result, or a direct call for mixers
+    registered as not cacheable (they are cheaper than a cache lookup).
+    
+    Returns:
+        list: Mixed color [R, G, B], or None when the mix has to be
+        computed and should go to a worker.
+    """
+    if not mixerInfo[name]["cacheable"]:
+        return mixingList[name](baseColorRGB, mixerColorRGB, mixRate)
+    cached = mixCache.get(mixKey(name, baseColorRGB, mixerColorRGB, mixRate))
+    return list(cached) if cached is not None else None
+
+def mixBatch(name, baseColors, mixerColors, mixRates):
+    """
+    Run a registered mixer over many color pairs at once, bypassing
+    mixCache so a batch does not flush the colors the user is mixing.
+    
+    Args:
+        name (str): Registered mixer name.
+        baseColors (list): Base colors [R, G, B].
+        mixerColors (list): Mixer colors [R, G, B].
+        mixRates (list): One rate per pair.
+        
+    Returns:
+        list: Mixed colors, one per pair.
+    """
+    info = mixerInfo[name]
+    if info["batch"] is not None:
+        return info["batch"](baseColors, mixerColors, mixRates)
+    func = info["func"]
+    if info["usesRate"]:
+        return [func(c1, c2, rate) for c1, c2, rate in zip(baseColors, mixerColors, mixRates)]
+    # rate is ignored, so each distinct pair only needs mixing once
+    mixed = {}
+    results = []
+    for c1, c2 in zip(baseColors, mixerColors):
+        key = (tuple(c1), tuple(c2))
+        if key not in mixed:
+            mixed[key] = func(c1, c2, None)
+        results.append(list(mixed[key]))
+    return results
+
+def mixCurve(name, baseColorRGB, mixerColorRGB, steps=100):
+    """
+    Colors a mixer produces between two colors at rates 1/steps .. 1,
+    i.e. every value of the mix slider, computed in one batch.
+    
+    Returns:
+        list: steps mixed colors [R, G, B].
+    """
+    rates = [i / steps for i in range(1, steps + 1)]
+    return mixBatch(name, [baseColorRGB] * steps, [mixerColorRGB] * steps, rates)
+
+def rgb8ToOkhsl(rgb):
+    """
+    Convert a 0-255 [R, G, B] color to Okhsl, reusing a swatch's cached
+    conversion when rgb is a DerivedColor.
+    """
+    return okhslOf(rgb)
+
+def spectralMix(baseColorRGB, mixerColorRGB, mixRate):
+    """
+    spectral_mix that reuses a swatch's cached reflectance terms when either
+    color is a DerivedColor.
+    """
+    KS1, l1 = reflectanceTermsOf(baseColorRGB)
+    KS2, l2 = reflectanceTermsOf(mixerColorRGB)
+    return mix_reflectance_terms(KS1, l1, KS2, l2, mixRate)
+
+def spectralBatch(baseColors, mixerColors, mixRates):
+    return spectralMixBatch(baseColors, mixerColors, mixRates)
+
+def hybridBatch(baseColors, mixerColors, mixRates):
+    spectralMixed = spectralMixBatch(baseColors, mixerColors, mixRates)
+    return [
+        mixWeightedAverage(
+            mixed1, mixWeightedAverage(c1, c2, rate), HYBRID_RATE / 100
+        )
+        for mixed1, c1, c2, rate in zip(spectralMixed, baseColors, mixerColors, mixRates)
+    ]
+
+def okhslToRgb8(hsl):
+    """
+    Convert Okhsl to a clamped 0-255 [R, G, B] color.
+    """
+    rgbLinear = okhslConverter.okhslToLinearSrgb(hsl)
+    return [encode8(rgbLinear.r), encode8(rgbLinear.g), encode8(rgbLinear.b)]
+
+@register_mixer("Spectral", batch=spectralBatch)
 def spectral(baseColorRGB, mixerColorRGB, mixRate):
     """
     Mix two colors using the spectral method.
@@ -36,9 +240,9 @@ def spectral(baseColorRGB, mixerColorRGB, mixRate):
     Returns:
         list: Resulting mixed color.
     """
-    return spectral_mix(baseColorRGB, mixerColorRGB, mixRate)
+    return spectralMix(baseColorRGB, mixerColorRGB, mixRate)
 
-@register_mixer("Weighted average")
+@register_mixer("Weighted average", cacheable=False)
 def mixWeightedAverage(baseColorRGB, mixerColorRGB, weight):
     """
     Mix two colors using a weighted average.
@@ -57,7 +261,7 @@ def mixWeightedAverage(baseColorRGB, mixerColorRGB, weight):
     mixBlue = int(wc * baseColorRGB[2] + weight * mixerColorRGB[2])
     return [mixRed, mixGreen, mixBlue]
 
-@register_mixer("Hybrid")
+@register_mixer("Hybrid", batch=hybridBatch)
 def hybridMix(baseColorRGB, mixerColorRGB, mixRate):
     """
     Hybrid mix combining spectral and weighted average methods.
@@ -70,12 +274,11 @@ def hybridMix(baseColorRGB, mixerColorRGB, mixRate):
     Returns:
         list: Resulting mixed color.
     """
-    hybridRate = 40  # Fixed percentage for hybrid mixing
-    mixed1 = spectral_mix(baseColorRGB, mixerColorRGB, mixRate)
+    mixed1 = spectralMix(baseColorRGB, mixerColorRGB, mixRate)
     mixed2 = mixWeightedAverage(baseColorRGB, mixerColorRGB, mixRate)
-    return mixWeightedAverage(mixed1, mixed2, hybridRate / 100)
+    return mixWeightedAverage(mixed1, mixed2, HYBRID_RATE / 100)
 
-@register_mixer("Overlay")
+@register_mixer("Overlay", cacheable=False)
 def overlayMix(baseColorRGB, mixerColorRGB, mixRate):
     """
     Mix two colors using an overlay blend mode.
@@ -132,12 +335,11 @@ def hybridOverlayMix(baseColorRGB, mixerColorRGB, mixRate):
     Returns:
         list: Resulting mixed color.
     """
-    hybridRate = 40  # Fixed percentage for hybrid mixing
-    mixed1 = spectral_mix(baseColorRGB, mixerColorRGB, mixRate)
+    mixed1 = spectralMix(baseColorRGB, mixerColorRGB, mixRate)
     mixed2 = overlayMix(baseColorRGB, mixerColorRGB, mixRate)
-    return mixWeightedAverage(mixed1, mixed2, hybridRate / 100)
+    return mixWeightedAverage(mixed1, mixed2, HYBRID_RATE / 100)
 
-@register_mixer("Sat Val")
+@register_mixer("Sat Val", usesRate=False)
 def satValTransfer(baseColorRGB, mixerColorRGB, mixRate=None):
     """
     Transfer saturation and value from the mixer color to the base color,
@@ -159,7 +361,7 @@ def satValTransfer(baseColorRGB, mixerColorRGB, mixRate=None):
     
     return [color.red(), color.green(), color.blue()]
 
-@register_mixer("Sat Val okhsl")
+@register_mixer("Sat Val okhsl", usesRate=False)
 def hslTransfer(baseColorRGB, mixerColorRGB, mixRate=None):
     """
     Transfer perceptual lightness and saturation from the mixer color to the base color
@@ -173,27 +375,17 @@ def hslTransfer(baseColorRGB, mixerColorRGB, mixRate=None):
     Returns:
         list: [R, G, B] in 0-255 base color with lightness transferred from mixer color.
     """
-    baseRgb = RGB(baseColorRGB[0] / 255.0, baseColorRGB[1] / 255.0, baseColorRGB[2] / 255.0)
-    mixerRgb = RGB(mixerColorRGB[0] / 255.0, mixerColorRGB[1] / 255.0, mixerColorRGB[2] / 255.0)
-    
     # Convert sRGB to Okhsl
-    baseHsl = srgbToOkhsl(baseRgb)
-    mixerHsl = srgbToOkhsl(mixerRgb)
+    baseHsl = rgb8ToOkhsl(baseColorRGB)
+    mixerHsl = rgb8ToOkhsl(mixerColorRGB)
     
     # Transfer lightness and saturation from the mixer while preserving the base hue
     newHsl = HSL(baseHsl.h, mixerHsl.s, mixerHsl.l)
     
-    # Convert back to sRGB
-    newRgb = okhslToSrgb(newHsl)
-    
-    # Convert normalized RGB back to 0-255 with clamping
-    r = round(clamp(newRgb.r, 0, 1) * 255)
-    g = round(clamp(newRgb.g, 0, 1) * 255)
-    b = round(clamp(newRgb.b, 0, 1) * 255)
-    
-    return [r, g, b]
+    # Convert back to 0-255 sRGB with clamping
+    return okhslToRgb8(newHsl)
 
-@register_mixer("lightness okhsl")
+@register_mixer("lightness okhsl", usesRate=False)
 def lightnessHslTransfer(baseColorRGB, mixerColorRGB, mixRate=None):
     """
     Transfer perceptual lightness and saturation from the mixer color to the base color
@@ -207,23 +399,12 @@ def lightnessHslTransfer(baseColorRGB, mixerColorRGB, mixRate=None):
     Returns:
         list: [R, G, B] in 0-255 base color with lightness transferred from mixer color.
     """
-    # Convert 0-255 input to normalized [0,1]
-    baseRgb = RGB(baseColorRGB[0] / 255.0, baseColorRGB[1] / 255.0, baseColorRGB[2] / 255.0)
-    mixerRgb = RGB(mixerColorRGB[0] / 255.0, mixerColorRGB[1] / 255.0, mixerColorRGB[2] / 255.0)
-    
     # Convert sRGB to Okhsl
-    baseHsl = srgbToOkhsl(baseRgb)
-    mixerHsl = srgbToOkhsl(mixerRgb)
+    baseHsl = rgb8ToOkhsl(baseColorRGB)
+    mixerHsl = rgb8ToOkhsl(mixerColorRGB)
     
     # Transfer lightness and saturation from the mixer while preserving the base hue
     newHsl = HSL(baseHsl.h, baseHsl.s, mixerHsl.l)
     
-    # Convert back to sRGB
-    newRgb = okhslToSrgb(newHsl)
-    
-    # Convert normalized RGB back to 0-255 with clamping
-    r = round(clamp(newRgb.r, 0, 1) * 255)
-    g = round(clamp(newRgb.g, 0, 1) * 255)
-    b = round(clamp(newRgb.b, 0, 1) * 255)
-    
-    return [r, g, b]
\ No newline at end of file
+    # Convert back to 0-255 sRGB with clamping
+    return okhslToRgb8(newHsl)
\ No newline at end of file
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+# default memory budget for all cached documents, in bytes
+DEFAULT_CACHE_BUDGET = 4 * 1024 * 1024
+# rough cost of one DerivedColor with all its representations built
+DERIVED_COLOR_BYTES = 1200
+
+
+def documentId(document):
+    """
+    Stable identity of an open document. Document wrappers are recreated on
+    every API call, but the root node keeps its unique id for the life of
+    the document.
+    """
+    return document.rootNode().uniqueId().toString()
+
+
+class DocumentState:
+    def __init__(self, palette, history):
+        # PaletteModel.saveState() of the document's palette
+        self.palette = palette
+        self.history = history
+
+    def size(self):
+        snapshot, derived = self.palette
+        built = sum(1 for color in derived if color is not None)
+        return len(snapshot) + built * DERIVED_COLOR_BYTES + self.history.usedBytes
+
+
+class DocumentStateCache:
+    """
+    Palette state and undo history of the open documents, keyed by
+    documentId, so switching back to a document restores it from memory
+    instead of re-reading its annotation. Least recently used documents
+    are dropped once the total passes the byte budget.
+    """
+
+    def __init__(self, budget=DEFAULT_CACHE_BUDGET):
+        self.budget = budget
+        self._states = OrderedDict()
+
+    def take(self, docId):
+        """
+        Remove and return the state of docId, or None. The active document
+        lives in the docker, not in the cache.
+        """
+        return self._states.pop(docId, None)
+
+    def put(self, docId, state):
+        self._states[docId] = state
+        self._states.move_to_end(docId)
+        self._evict()
+
+    def prune(self, openIds):
+        """
+        Drop the states of documents that are no longer open.
+        """
+        for docId in [d for d in self._states if d not in openIds]:
+            del self._states[docId]
+
+    def clear(self):
+        self._states.clear()
+
+    def size(self):
+        return sum(state.size() for state in self._states.values())
+
+    def _evict(self):
+        total = self.size()
+        while total > self.budget and self._states:
+            _, state = self._states.popitem(last=False)
+            total -= state.size()
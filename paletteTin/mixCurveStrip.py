@@ -0,0 +1,44 @@
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter, QColor, QPen
+from PyQt5.QtWidgets import QWidget, QSizePolicy
+
+MARKER_COLOR = QColor(255, 255, 255)
+
+
+class MixCurveStrip(QWidget):
+    """
+    Gradient strip showing the colors a mix produces at every slider value,
+    with a marker at the current rate.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.colors = []
+        self.rate = 50
+        self.setMinimumHeight(8)
+        self.setMaximumHeight(12)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def setCurve(self, curve):
+        self.colors = [QColor(r, g, b) for r, g, b in curve] if curve else []
+        self.update()
+
+    def setRate(self, rate):
+        self.rate = rate
+        self.update()
+
+    def paintEvent(self, e):
+        if not self.colors:
+            return
+        qp = QPainter(self)
+        width = self.width()
+        height = self.height()
+        step = width / len(self.colors)
+        qp.setPen(Qt.NoPen)
+        for i, color in enumerate(self.colors):
+            # overlap by one pixel so fractional slices leave no seams
+            qp.fillRect(QRectF(i * step, 0, step + 1, height), color)
+        marker = (self.rate - 0.5) * step
+        qp.setPen(QPen(MARKER_COLOR, 1))
+        qp.drawLine(int(marker), 0, int(marker), height)
+        qp.end()
@@ -0,0 +1,90 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class MixSignals(QObject):
+    # generation, result
+    finished = pyqtSignal(int, object)
+    # generation, error message
+    failed = pyqtSignal(int, str)
+
+
+class MixJob(QRunnable):
+    def __init__(self, generation, func):
+        super().__init__()
+        self.generation = generation
+        self.func = func
+        self.signals = MixSignals()
+
+    def run(self):
+        try:
+            result = self.func()
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+            return
+        self.signals.finished.emit(self.generation, result)
+
+
+class MixExecutor(QObject):
+    """
+    Runs mix jobs on a QThreadPool and hands results back on the GUI thread.
+
+    Every submit() under a key bumps that key's generation; a result is
+    delivered only if no newer job for the same key was submitted since,
+    so a late answer can never overwrite a fresher one.
+    """
+
+    def __init__(self, parent=None, maxThreads=2):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(maxThreads)
+        self.generations = {}
+        # signal objects of running jobs, kept alive until their result lands
+        self._pending = {}
+
+    def submit(self, key, func, callback, failed=None):
+        """
+        Run func() on a worker and call callback(result) on the GUI thread,
+        unless a newer job for key is submitted in the meantime. If func
+        raises, failed(message) is called instead when given.
+        """
+        generation = self.generations.get(key, 0) + 1
+        self.generations[key] = generation
+        job = MixJob(generation, func)
+        self._pending[id(job.signals)] = job.signals
+        job.signals.finished.connect(
+            lambda gen, result, signals=job.signals: self._finished(
+                key, gen, result, callback, signals
+            )
+        )
+        job.signals.failed.connect(
+            lambda gen, message, signals=job.signals: self._failed(
+                key, message, failed, signals
+            )
+        )
+        self.pool.start(job)
+        return generation
+
+    def cancel(self, key):
+        # results already queued for key are dropped when they arrive
+        self.generations[key] = self.generations.get(key, 0) + 1
+
+    def cancelAll(self):
+        for key in self.generations:
+            self.generations[key] += 1
+
+    def isCurrent(self, key, generation):
+        return self.generations.get(key) == generation
+
+    def _finished(self, key, generation, result, callback, signals):
+        self._pending.pop(id(signals), None)
+        if self.isCurrent(key, generation):
+            callback(result)
+
+    def _failed(self, key, message, failed, signals):
+        self._pending.pop(id(signals), None)
+        print(f"Mix job {key} failed: {message}")
+        if failed is not None:
+            failed(message)
+
+    def waitForDone(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
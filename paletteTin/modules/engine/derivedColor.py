@@ -0,0 +1,54 @@
+"""
+8-bit colors that keep their derived representations.
+
+A palette swatch is mixed far more often than it changes, so DerivedColor
+computes its linear RGB, spectral reflectance terms, Oklab and Okhsl once,
+on first use, and keeps them for as long as the swatch holds that color.
+It is a plain (r, g, b) tuple otherwise, so every mixer accepts it.
+"""
+
+from functools import cached_property
+
+from ..oklab.oklab import RGB, OkhslConverter, linearSrgbToOklab
+from ..spectraljs.spectral import reflectance_terms
+from ..transfer.transfer import decode8
+
+# Shared hue-table converter for the Okhsl paths, built once at import
+okhslConverter = OkhslConverter()
+
+
+def rgb8ToLinear(rgb):
+    return RGB(decode8(rgb[0]), decode8(rgb[1]), decode8(rgb[2]))
+
+
+class DerivedColor(tuple):
+    def __new__(cls, rgb):
+        return super().__new__(cls, (rgb[0], rgb[1], rgb[2]))
+
+    @cached_property
+    def linear(self):
+        return rgb8ToLinear(self)
+
+    @cached_property
+    def reflectanceTerms(self):
+        return reflectance_terms(self)
+
+    @cached_property
+    def oklab(self):
+        return linearSrgbToOklab(self.linear)
+
+    @cached_property
+    def okhsl(self):
+        return okhslConverter.linearSrgbToOkhsl(self.linear)
+
+
+def reflectanceTermsOf(color):
+    if isinstance(color, DerivedColor):
+        return color.reflectanceTerms
+    return reflectance_terms(color)
+
+
+def okhslOf(color):
+    if isinstance(color, DerivedColor):
+        return color.okhsl
+    return okhslConverter.linearSrgbToOkhsl(rgb8ToLinear(color))
@@ -0,0 +1,91 @@
+"""
+Backend switch for batch color operations.
+
+Krita's bundled Python does not always ship numpy, so the engine checks for
+it once at import. With numpy, batch calls go to the vectorized kernels;
+without it they run a pure-Python path that memoizes the per-color half of
+the work (reflectance K/S terms) and fuses the rest into a single loop.
+Both backends produce identical 8-bit results, so callers never need to
+know which one ran.
+"""
+
+from ..spectraljs.spectral import (
+    BASIS,
+    mix_reflectance_terms,
+    reflectance_terms,
+    spectral_mix_batch,
+)
+from .derivedColor import DerivedColor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+_backend = "numpy" if HAS_NUMPY else "python"
+
+
+def backend():
+    return _backend
+
+
+def setBackend(name=None):
+    """
+    Force "numpy" or "python", or pass None to pick the best available.
+    """
+    global _backend
+    if name is None:
+        name = "numpy" if HAS_NUMPY else "python"
+    if name not in ("numpy", "python"):
+        raise ValueError(f"Unknown engine backend: {name}")
+    if name == "numpy" and not HAS_NUMPY:
+        raise ImportError("numpy backend requested but numpy is not installed")
+    _backend = name
+
+
+def _rateList(rates, count):
+    if isinstance(rates, (int, float)):
+        return [rates] * count
+    return list(rates)
+
+
+def spectralMixBatch(colors1, colors2, rates, basis=None):
+    """
+    Spectral mix of N color pairs.
+
+    Args:
+        colors1 (sequence): N base colors [R, G, B] in 0-255.
+        colors2 (sequence): N mixer colors [R, G, B] in 0-255.
+        rates (float or sequence): One rate for all pairs, or N rates.
+
+    Returns:
+        list: N mixed colors [R, G, B], same as calling spectral_mix per pair.
+    """
+    basis = basis or BASIS
+    colors1 = list(colors1)
+    colors2 = list(colors2)
+    if not colors1:
+        return []
+    if _backend == "numpy":
+        return spectral_mix_batch(colors1, colors2, rates, basis).tolist()
+
+    rates = _rateList(rates, len(colors1))
+    terms = {}
+    mixed = []
+    for color1, color2, rate in zip(colors1, colors2, rates):
+        KS1, l1 = _termsFor(color1, terms, basis)
+        KS2, l2 = _termsFor(color2, terms, basis)
+        mixed.append(mix_reflectance_terms(KS1, l1, KS2, l2, rate, basis))
+    return mixed
+
+
+def _termsFor(color, terms, basis):
+    # swatches already carry their terms for the default basis
+    if basis is BASIS and isinstance(color, DerivedColor):
+        return color.reflectanceTerms
+    key = tuple(color)
+    if key not in terms:
+        terms[key] = reflectance_terms(key, basis)
+    return terms[key]
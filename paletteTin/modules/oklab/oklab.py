@@ -22,8 +22,12 @@ SOFTWARE.
 
 import math
 
-# Data structures
+from ..transfer.transfer import decode, encode
+
+# Data structures, slotted so per-color conversions stay cheap to allocate
 class Lab:
+    __slots__ = ("L", "a", "b")
+
     def __init__(self, L, a, b):
         self.L = L
         self.a = a
@@ -33,6 +37,8 @@ class Lab:
         return f"L:{self.L},a:{self.a},b:{self.b}"
 
 class RGB:
+    __slots__ = ("r", "g", "b")
+
     def __init__(self, r, g, b):
         self.r = r
         self.g = g
@@ -42,6 +48,8 @@ class RGB:
         return f"r:{self.r},g:{self.g},b:{self.b}"
 
 class HSV:
+    __slots__ = ("h", "s", "v")
+
     def __init__(self, h, s, v):
         self.h = h
         self.s = s
@@ -51,6 +59,8 @@ class HSV:
         return f"h:{self.h},s:{self.s},v:{self.v}"
 
 class HSL:
+    __slots__ = ("h", "s", "l")
+
     def __init__(self, h, s, l):
         self.h = h
         self.s = s
@@ -60,16 +70,22 @@ class HSL:
         return f"h:{self.h},s:{self.s},l:{self.l}"
 
 class LC:
+    __slots__ = ("L", "C")
+
     def __init__(self, L, C):
         self.L = L
         self.C = C
 
 class ST:
+    __slots__ = ("S", "T")
+
     def __init__(self, S, T):
         self.S = S
         self.T = T
 
 class Cs:
+    __slots__ = ("C0", "Cmid", "Cmax")
+
     def __init__(self, C0, Cmid, Cmax):
         self.C0 = C0
         self.Cmid = Cmid
@@ -87,17 +103,8 @@ def clamp(x, minVal, maxVal):
 def sgn(x):
     return (1 if x > 0 else 0) - (1 if x < 0 else 0)
 
-def srgbTransferFunction(a: float):
-    if a <= 0.0031308:
-        return 12.92 * a
-    else:
-        return 1.055 * (a ** 0.4166666666666667) - 0.055
-
-def srgbTransferFunctionInv(a: float):
-    if a > 0.04045:
-        return ((a + 0.055) / 1.055) ** 2.4
-    else:
-        return a / 12.92
+srgbTransferFunction = encode
+srgbTransferFunctionInv = decode
 
 def cubeRoot(x: float):
     return math.copysign(abs(x) ** (1/3), x)
@@ -348,12 +355,14 @@ def getSTMid(a_, b_):
                 0.00299215 - 0.45399568 * b_ - 0.14661872 * a_))))
     return ST(S_val, T_val)
 
-def getCs(L, a_, b_):
-    cusp = findCusp(a_, b_)
+def getCs(L, a_, b_, cusp=None, ST_mid=None):
+    if cusp is None:
+        cusp = findCusp(a_, b_)
     Cmax = findGamutIntersection(a_, b_, L, 1, L, cusp)
     ST_max = toST(cusp)
     k = Cmax / min(L * ST_max.S, (1 - L) * ST_max.T)
-    ST_mid = getSTMid(a_, b_)
+    if ST_mid is None:
+        ST_mid = getSTMid(a_, b_)
     C_a = L * ST_mid.S
     C_b = (1 - L) * ST_mid.T
     C_mid = 0.9 * k * math.sqrt(math.sqrt(1 / ((1 / (C_a ** 4)) + (1 / (C_b ** 4)))))
@@ -362,7 +371,15 @@ def getCs(L, a_, b_):
     C0 = math.sqrt(1 / ((1 / (C_a0 ** 2)) + (1 / (C_b0 ** 2))))
     return Cs(C0, C_mid, Cmax)
 
-def okhslToSrgb(hsl):
+def okhslToSrgb(hsl, converter=None):
+    rgbLinear = okhslToLinearSrgb(hsl, converter)
+    return RGB(
+        srgbTransferFunction(rgbLinear.r),
+        srgbTransferFunction(rgbLinear.g),
+        srgbTransferFunction(rgbLinear.b)
+    )
+
+def okhslToLinearSrgb(hsl, converter=None):
     h = hsl.h
     s = hsl.s
     l_val = hsl.l
@@ -373,7 +390,7 @@ def okhslToSrgb(hsl):
     a_ = math.cos(2 * pi * h)
     b_ = math.sin(2 * pi * h)
     L = toeInv(l_val)
-    cs = getCs(L, a_, b_)
+    cs = converter.getCs(L, h, a_, b_) if converter else getCs(L, a_, b_)
     C0, Cmid, Cmax = cs.C0, cs.Cmid, cs.Cmax
     mid = 0.8
     midInv = 1.25
@@ -389,25 +406,23 @@ def okhslToSrgb(hsl):
         k2 = 1 - (k1 / (Cmax - Cmid))
         C_val = k0 + t * k1 / (1 - k2 * t)
     lab = Lab(L, C_val * a_, C_val * b_)
-    rgbLinear = oklabToLinearSrgb(lab)
-    return RGB(
-        srgbTransferFunction(rgbLinear.r),
-        srgbTransferFunction(rgbLinear.g),
-        srgbTransferFunction(rgbLinear.b)
-    )
+    return oklabToLinearSrgb(lab)
 
-def srgbToOkhsl(rgb: RGB):
-    lab = linearSrgbToOklab(RGB(
+def srgbToOkhsl(rgb: RGB, converter=None):
+    return linearSrgbToOkhsl(RGB(
         srgbTransferFunctionInv(rgb.r),
         srgbTransferFunctionInv(rgb.g),
         srgbTransferFunctionInv(rgb.b)
-    ))
+    ), converter)
+
+def linearSrgbToOkhsl(rgbLinear: RGB, converter=None):
+    lab = linearSrgbToOklab(rgbLinear)
     C_val = math.sqrt(lab.a * lab.a + lab.b * lab.b)
     a_ = lab.a / C_val if C_val != 0 else 0
     b_ = lab.b / C_val if C_val != 0 else 0
     L = lab.L
     h = 0.5 + 0.5 * math.atan2(-lab.b, -lab.a) / pi
-    cs = getCs(L, a_, b_)
+    cs = converter.getCs(L, h, a_, b_) if converter else getCs(L, a_, b_)
     C0, Cmid, Cmax = cs.C0, cs.Cmid, cs.Cmax
     mid = 0.8
     midInv = 1.25
@@ -425,13 +440,21 @@ def srgbToOkhsl(rgb: RGB):
     l_final = toe(L)
     return HSL(h, s, l_final)
 
-def okhsvToSrgb(hsv):
+def okhsvToSrgb(hsv, converter=None):
+    rgbLinear = okhsvToLinearSrgb(hsv, converter)
+    return RGB(
+        srgbTransferFunction(rgbLinear.r),
+        srgbTransferFunction(rgbLinear.g),
+        srgbTransferFunction(rgbLinear.b)
+    )
+
+def okhsvToLinearSrgb(hsv, converter=None):
     h = hsv.h
     s = hsv.s
     v = hsv.v
     a_ = math.cos(2 * pi * h)
     b_ = math.sin(2 * pi * h)
-    cusp = findCusp(a_, b_)
+    cusp = converter.findCusp(h, a_, b_) if converter else findCusp(a_, b_)
     ST_max = toST(cusp)
     S_max, T_max = ST_max.S, ST_max.T
     S0 = 0.5
@@ -449,25 +472,23 @@ def okhsvToSrgb(hsv):
     scaleL = cubeRoot(1 / max(max(rgbScale.r, rgbScale.g), max(rgbScale.b, 0)))
     L_val *= scaleL
     C_val *= scaleL
-    rgbLinear = oklabToLinearSrgb(Lab(L_val, C_val * a_, C_val * b_))
-    return RGB(
-        srgbTransferFunction(rgbLinear.r),
-        srgbTransferFunction(rgbLinear.g),
-        srgbTransferFunction(rgbLinear.b)
-    )
+    return oklabToLinearSrgb(Lab(L_val, C_val * a_, C_val * b_))
 
-def srgbToOkhsv(rgb):
-    lab = linearSrgbToOklab(RGB(
+def srgbToOkhsv(rgb, converter=None):
+    return linearSrgbToOkhsv(RGB(
         srgbTransferFunctionInv(rgb.r),
         srgbTransferFunctionInv(rgb.g),
         srgbTransferFunctionInv(rgb.b)
-    ))
+    ), converter)
+
+def linearSrgbToOkhsv(rgbLinear: RGB, converter=None):
+    lab = linearSrgbToOklab(rgbLinear)
     C_val = math.sqrt(lab.a * lab.a + lab.b * lab.b)
     a_ = lab.a / C_val if C_val != 0 else 0
     b_ = lab.b / C_val if C_val != 0 else 0
     L = lab.L
     h = 0.5 + 0.5 * math.atan2(-lab.b, -lab.a) / pi
-    cusp = findCusp(a_, b_)
+    cusp = converter.findCusp(h, a_, b_) if converter else findCusp(a_, b_)
     ST_max = toST(cusp)
     S_max, T_max = ST_max.S, ST_max.T
     S0 = 0.5
@@ -485,4 +506,116 @@ def srgbToOkhsv(rgb):
     L = toe(L)
     v = L / L_v if L_v != 0 else 0
     s_val = (S0 + T_max) * C_v / (T_max * S0 + T_max * k * C_v) if (T_max * S0 + T_max * k * C_v) != 0 else 0
-    return HSV(h, s_val, v)
\ No newline at end of file
+    return HSV(h, s_val, v)
+
+def _cuspBranch(a, b):
+    # which gamut face bounds the cusp; the cusp is only smooth within one
+    if (-1.88170328 * a - 0.80936493 * b) > 1:
+        saturationBranch = 0
+    elif (1.81444104 * a - 1.19445276 * b) > 1:
+        saturationBranch = 1
+    else:
+        saturationBranch = 2
+    S_cusp = computeMaxSaturation(a, b)
+    rgbAtMax = oklabToLinearSrgb(Lab(1, S_cusp * a, S_cusp * b))
+    channels = (rgbAtMax.r, rgbAtMax.g, rgbAtMax.b)
+    return saturationBranch, channels.index(max(channels))
+
+class OkhslConverter:
+    """
+    Reusable Okhsl/Okhsv converter that looks up the hue-only terms (the
+    gamut cusp and ST_mid) in a table of `bins` hue samples instead of
+    solving for them on every color. Values are linearly interpolated
+    between samples; bins that straddle a kink in the gamut boundary, and
+    achromatic colors with no hue, fall back to the exact solve.
+
+    Cmax still depends on L, so getCs keeps its single gamut intersection
+    step, but it starts from the tabulated cusp.
+    """
+    def __init__(self, bins=4096):
+        self.bins = bins
+        self.cuspL = []
+        self.cuspC = []
+        self.midS = []
+        self.midT = []
+        self.exact = []
+        branches = []
+        for i in range(bins + 1):
+            a_ = math.cos(2 * pi * i / bins)
+            b_ = math.sin(2 * pi * i / bins)
+            cusp = findCusp(a_, b_)
+            ST_mid = getSTMid(a_, b_)
+            self.cuspL.append(cusp.L)
+            self.cuspC.append(cusp.C)
+            self.midS.append(ST_mid.S)
+            self.midT.append(ST_mid.T)
+            branches.append(_cuspBranch(a_, b_))
+        self.exact = [branches[i] != branches[i + 1] for i in range(bins)]
+
+    def _bin(self, h, a_, b_):
+        if a_ == 0 and b_ == 0:
+            return None, 0
+        f = (h % 1.0) * self.bins
+        i = int(f)
+        if i >= self.bins or self.exact[i]:
+            return None, 0
+        return i, f - i
+
+    def findCusp(self, h, a_, b_):
+        i, t = self._bin(h, a_, b_)
+        if i is None:
+            return findCusp(a_, b_)
+        cuspL, cuspC = self.cuspL, self.cuspC
+        return LC(
+            cuspL[i] + (cuspL[i + 1] - cuspL[i]) * t,
+            cuspC[i] + (cuspC[i + 1] - cuspC[i]) * t
+        )
+
+    def getSTMid(self, h, a_, b_):
+        i, t = self._bin(h, a_, b_)
+        if i is None:
+            return getSTMid(a_, b_)
+        midS, midT = self.midS, self.midT
+        return ST(
+            midS[i] + (midS[i + 1] - midS[i]) * t,
+            midT[i] + (midT[i + 1] - midT[i]) * t
+        )
+
+    def getCs(self, L, h, a_, b_):
+        i, t = self._bin(h, a_, b_)
+        if i is None:
+            return getCs(L, a_, b_)
+        cuspL, cuspC, midS, midT = self.cuspL, self.cuspC, self.midS, self.midT
+        cusp = LC(
+            cuspL[i] + (cuspL[i + 1] - cuspL[i]) * t,
+            cuspC[i] + (cuspC[i + 1] - cuspC[i]) * t
+        )
+        ST_mid = ST(
+            midS[i] + (midS[i + 1] - midS[i]) * t,
+            midT[i] + (midT[i + 1] - midT[i]) * t
+        )
+        return getCs(L, a_, b_, cusp, ST_mid)
+
+    def okhslToSrgb(self, hsl):
+        return okhslToSrgb(hsl, self)
+
+    def okhslToLinearSrgb(self, hsl):
+        return okhslToLinearSrgb(hsl, self)
+
+    def srgbToOkhsl(self, rgb):
+        return srgbToOkhsl(rgb, self)
+
+    def linearSrgbToOkhsl(self, rgbLinear):
+        return linearSrgbToOkhsl(rgbLinear, self)
+
+    def okhsvToSrgb(self, hsv):
+        return okhsvToSrgb(hsv, self)
+
+    def okhsvToLinearSrgb(self, hsv):
+        return okhsvToLinearSrgb(hsv, self)
+
+    def srgbToOkhsv(self, rgb):
+        return srgbToOkhsv(rgb, self)
+
+    def linearSrgbToOkhsv(self, rgbLinear):
+        return linearSrgbToOkhsv(rgbLinear, self)
@@ -0,0 +1,312 @@
+'''
+Vectorized counterparts of the conversions in oklab.py.
+
+Every function takes and returns an (N, 3) float array, one color per row,
+with the channels in the same order as the scalar classes (r, g, b / L, a, b
+/ h, s, l / h, s, v). Results match the scalar functions to rounding error.
+Colors with no chroma get s = 0 instead of the scalar division by zero.
+'''
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ..transfer.transfer import DECODE_KNEE, ENCODE_KNEE, GAMMA
+
+LMS_TO_RGB = [
+    [4.0767416621, -3.3077115913, 0.2309699292],
+    [-1.2684380046, 2.6097574011, -0.3413193965],
+    [-0.0041960863, -0.7034186147, 1.7076147010],
+]
+
+# computeMaxSaturation coefficients per bounding channel (r, g, b)
+MAX_SATURATION_K = [
+    [1.19086277, 1.76576728, 0.59662641, 0.75515197, 0.56771245],
+    [0.73956515, -0.45954404, 0.08285427, 0.12541070, 0.14503204],
+    [1.35733652, -0.00915799, -1.15130210, -0.50559606, 0.00692167],
+]
+
+def _requireNumpy():
+    if np is None:
+        raise ImportError("oklabArray requires numpy")
+
+def _columns(arr):
+    _requireNumpy()
+    arr = np.asarray(arr, dtype=float).reshape(-1, 3)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+def _stack(x, y, z):
+    return np.stack([x, y, z], axis=1)
+
+def srgbTransferFunctionArray(a):
+    a = np.asarray(a, dtype=float)
+    return np.where(
+        a < ENCODE_KNEE,
+        12.92 * a,
+        1.055 * np.abs(a) ** (1.0 / GAMMA) - 0.055
+    )
+
+def srgbTransferFunctionInvArray(a):
+    a = np.asarray(a, dtype=float)
+    return np.where(
+        a < DECODE_KNEE,
+        a / 12.92,
+        (np.abs(a + 0.055) / 1.055) ** GAMMA
+    )
+
+def _linearToOklab(r, g, b):
+    l = np.cbrt(0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b)
+    m = np.cbrt(0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b)
+    s = np.cbrt(0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b)
+    return (
+        0.2104542553 * l + 0.7936177850 * m - 0.0040720468 * s,
+        1.9779984951 * l - 2.4285922050 * m + 0.4505937099 * s,
+        0.0259040371 * l + 0.7827717662 * m - 0.8086757660 * s
+    )
+
+def _oklabToLinear(L, a, b):
+    l = (L + 0.3963377774 * a + 0.2158037573 * b) ** 3
+    m = (L - 0.1055613458 * a - 0.0638541728 * b) ** 3
+    s = (L - 0.0894841775 * a - 1.2914855480 * b) ** 3
+    (r0, r1, r2), (g0, g1, g2), (b0, b1, b2) = LMS_TO_RGB
+    return (
+        r0 * l + r1 * m + r2 * s,
+        g0 * l + g1 * m + g2 * s,
+        b0 * l + b1 * m + b2 * s
+    )
+
+def _lmsSlopes(a, b):
+    kL = 0.3963377774 * a + 0.2158037573 * b
+    kM = -0.1055613458 * a - 0.0638541728 * b
+    kS = -0.0894841775 * a - 1.2914855480 * b
+    return kL, kM, kS
+
+def _computeMaxSaturation(a, b):
+    channel = np.where(
+        (-1.88170328 * a - 0.80936493 * b) > 1, 0,
+        np.where((1.81444104 * a - 1.19445276 * b) > 1, 1, 2)
+    )
+    k0, k1, k2, k3, k4 = np.array(MAX_SATURATION_K)[channel].T
+    wl, wm, ws = np.array(LMS_TO_RGB)[channel].T
+
+    S = k0 + k1 * a + k2 * b + k3 * a * a + k4 * a * b
+
+    kL, kM, kS = _lmsSlopes(a, b)
+    l_ = 1 + S * kL
+    m_ = 1 + S * kM
+    s_ = 1 + S * kS
+
+    f = wl * l_ ** 3 + wm * m_ ** 3 + ws * s_ ** 3
+    f1 = 3 * (wl * kL * l_ ** 2 + wm * kM * m_ ** 2 + ws * kS * s_ ** 2)
+    f2 = 6 * (wl * kL ** 2 * l_ + wm * kM ** 2 * m_ + ws * kS ** 2 * s_)
+
+    return S - f * f1 / (f1 * f1 - 0.5 * f * f2)
+
+def _findCusp(a, b):
+    S_cusp = _computeMaxSaturation(a, b)
+    r, g, b_ = _oklabToLinear(1, S_cusp * a, S_cusp * b)
+    L_cusp = np.cbrt(1 / np.maximum(np.maximum(r, g), b_))
+    return L_cusp, L_cusp * S_cusp
+
+def _findGamutIntersection(a, b, L1, C1, L0, cuspL, cuspC):
+    lower = ((L1 - L0) * cuspC - (cuspL - L0) * C1) <= 0
+    t_lower = cuspC * L0 / (C1 * cuspL + cuspC * (L0 - L1))
+    t = cuspC * (L0 - 1) / (C1 * (cuspL - 1) + cuspC * (L0 - L1))
+
+    kL, kM, kS = _lmsSlopes(a, b)
+    dL = L1 - L0
+    lDt = dL + C1 * kL
+    mDt = dL + C1 * kM
+    sDt = dL + C1 * kS
+
+    L_val = L0 * (1 - t) + t * L1
+    C_val = t * C1
+    l_ = L_val + C_val * kL
+    m_ = L_val + C_val * kM
+    s_ = L_val + C_val * kS
+
+    cubed = (l_ ** 3, m_ ** 3, s_ ** 3)
+    first = (3 * lDt * l_ ** 2, 3 * mDt * m_ ** 2, 3 * sDt * s_ ** 2)
+    second = (6 * lDt ** 2 * l_, 6 * mDt ** 2 * m_, 6 * sDt ** 2 * s_)
+
+    step = np.full_like(t, np.inf)
+    for w0, w1, w2 in LMS_TO_RGB:
+        value = w0 * cubed[0] + w1 * cubed[1] + w2 * cubed[2] - 1
+        d1 = w0 * first[0] + w1 * first[1] + w2 * first[2]
+        d2 = w0 * second[0] + w1 * second[1] + w2 * second[2]
+        denom = d1 * d1 - 0.5 * value * d2
+        u = np.where(denom != 0, d1 / np.where(denom != 0, denom, 1), 0)
+        step = np.minimum(step, np.where(u >= 0, -value * u, np.inf))
+
+    return np.where(lower, t_lower, t + step)
+
+def _toe(x):
+    k1, k2 = 0.206, 0.03
+    k3 = (1 + k1) / (1 + k2)
+    return 0.5 * (k3 * x - k1 + np.sqrt((k3 * x - k1) ** 2 + 4 * k2 * k3 * x))
+
+def _toeInv(x):
+    k1, k2 = 0.206, 0.03
+    k3 = (1 + k1) / (1 + k2)
+    return (x * x + k1 * x) / (k3 * (x + k2))
+
+def _getSTMid(a_, b_):
+    S = 0.11516993 + 1 / (7.44778970 + 4.15901240 * b_ + a_ * (
+        -2.19557347 + 1.75198401 * b_ + a_ * (
+            -2.13704948 - 10.02301043 * b_ + a_ * (
+                -4.24894561 + 5.38770819 * b_ + 4.69891013 * a_))))
+    T = 0.11239642 + 1 / (1.61320320 - 0.68124379 * b_ + a_ * (
+        0.40370612 + 0.90148123 * b_ + a_ * (
+            -0.27087943 + 0.61223990 * b_ + a_ * (
+                0.00299215 - 0.45399568 * b_ - 0.14661872 * a_))))
+    return S, T
+
+def _getCs(L, a_, b_):
+    cuspL, cuspC = _findCusp(a_, b_)
+    Cmax = _findGamutIntersection(a_, b_, L, 1, L, cuspL, cuspC)
+    k = Cmax / np.minimum(L * cuspC / cuspL, (1 - L) * cuspC / (1 - cuspL))
+    midS, midT = _getSTMid(a_, b_)
+    C_a = L * midS
+    C_b = (1 - L) * midT
+    C_mid = 0.9 * k * np.sqrt(np.sqrt(1 / (1 / C_a ** 4 + 1 / C_b ** 4)))
+    C_a0 = L * 0.4
+    C_b0 = (1 - L) * 0.8
+    C0 = np.sqrt(1 / (1 / C_a0 ** 2 + 1 / C_b0 ** 2))
+    return C0, C_mid, Cmax
+
+def _hueAndDirection(a, b):
+    C = np.sqrt(a * a + b * b)
+    safeC = np.where(C != 0, C, 1)
+    # achromatic colors take an arbitrary hue direction; s comes out 0
+    a_ = np.where(C != 0, a / safeC, 1)
+    b_ = np.where(C != 0, b / safeC, 0)
+    h = 0.5 + 0.5 * np.arctan2(-b, -a) / np.pi
+    return C, a_, b_, h
+
+def linearSrgbToOklabArray(arr):
+    return _stack(*_linearToOklab(*_columns(arr)))
+
+def oklabToLinearSrgbArray(arr):
+    return _stack(*_oklabToLinear(*_columns(arr)))
+
+def srgbToOklabArray(arr):
+    r, g, b = _columns(arr)
+    return _stack(*_linearToOklab(
+        srgbTransferFunctionInvArray(r),
+        srgbTransferFunctionInvArray(g),
+        srgbTransferFunctionInvArray(b)
+    ))
+
+def okhslToLinearSrgbArray(arr):
+    h, s, l_val = _columns(arr)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a_ = np.cos(2 * np.pi * h)
+        b_ = np.sin(2 * np.pi * h)
+        L = _toeInv(l_val)
+        C0, Cmid, Cmax = _getCs(L, a_, b_)
+        mid = 0.8
+        midInv = 1.25
+
+        t_low = midInv * s
+        k1_low = mid * C0
+        k2_low = 1 - k1_low / Cmid
+        C_low = t_low * k1_low / (1 - k2_low * t_low)
+
+        t_high = (s - mid) / (1 - mid)
+        k1_high = (1 - mid) * Cmid * Cmid * midInv * midInv / C0
+        k2_high = 1 - k1_high / (Cmax - Cmid)
+        C_high = Cmid + t_high * k1_high / (1 - k2_high * t_high)
+
+        C_val = np.where(s < mid, C_low, C_high)
+        r, g, b = _oklabToLinear(L, C_val * a_, C_val * b_)
+
+    black = l_val == 0
+    white = l_val == 1
+    rgb = _stack(r, g, b)
+    rgb[black] = 0
+    rgb[white] = 1
+    return rgb
+
+def okhslToSrgbArray(arr):
+    return srgbTransferFunctionArray(okhslToLinearSrgbArray(arr))
+
+def linearSrgbToOkhslArray(arr):
+    L, a, b = _linearToOklab(*_columns(arr))
+    C_val, a_, b_, h = _hueAndDirection(a, b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        C0, Cmid, Cmax = _getCs(L, a_, b_)
+        mid = 0.8
+        midInv = 1.25
+
+        k1_low = mid * C0
+        k2_low = 1 - k1_low / Cmid
+        s_low = mid * C_val / (k1_low + k2_low * C_val)
+
+        k1_high = (1 - mid) * Cmid * Cmid * midInv * midInv / C0
+        k2_high = 1 - k1_high / (Cmax - Cmid)
+        dC = C_val - Cmid
+        s_high = mid + (1 - mid) * dC / (k1_high + k2_high * dC)
+
+        s = np.where(C_val < Cmid, s_low, s_high)
+    s = np.where(np.isfinite(s) & (C_val != 0), s, 0)
+    return _stack(h, s, _toe(L))
+
+def srgbToOkhslArray(arr):
+    return linearSrgbToOkhslArray(srgbTransferFunctionInvArray(arr))
+
+def okhsvToLinearSrgbArray(arr):
+    h, s, v = _columns(arr)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a_ = np.cos(2 * np.pi * h)
+        b_ = np.sin(2 * np.pi * h)
+        cuspL, cuspC = _findCusp(a_, b_)
+        S_max = cuspC / cuspL
+        T_max = cuspC / (1 - cuspL)
+        S0 = 0.5
+        k = 1 - S0 / S_max
+        denom = S0 + T_max - T_max * k * s
+        L_v = 1 - s * S0 / denom
+        C_v = s * T_max * S0 / denom
+        L_val = v * L_v
+        C_val = v * C_v
+        L_vt = _toeInv(L_v)
+        C_vt = np.where(L_v != 0, C_v * L_vt / L_v, 0)
+        L_new = _toeInv(L_val)
+        C_val = np.where(L_val != 0, C_val * L_new / L_val, 0)
+        L_val = L_new
+        r, g, b = _oklabToLinear(L_vt, a_ * C_vt, b_ * C_vt)
+        scaleL = np.cbrt(1 / np.maximum(np.maximum(r, g), np.maximum(b, 0)))
+        L_val = L_val * scaleL
+        C_val = C_val * scaleL
+        return _stack(*_oklabToLinear(L_val, C_val * a_, C_val * b_))
+
+def okhsvToSrgbArray(arr):
+    return srgbTransferFunctionArray(okhsvToLinearSrgbArray(arr))
+
+def linearSrgbToOkhsvArray(arr):
+    L, a, b = _linearToOklab(*_columns(arr))
+    C_val, a_, b_, h = _hueAndDirection(a, b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cuspL, cuspC = _findCusp(a_, b_)
+        S_max = cuspC / cuspL
+        T_max = cuspC / (1 - cuspL)
+        S0 = 0.5
+        k = 1 - S0 / S_max
+        t = T_max / (C_val + L * T_max)
+        L_v = t * L
+        C_v = t * C_val
+        L_vt = _toeInv(L_v)
+        C_vt = np.where(L_v != 0, C_v * L_vt / L_v, 0)
+        r, g, b = _oklabToLinear(L_vt, a_ * C_vt, b_ * C_vt)
+        scaleL = np.cbrt(1 / np.maximum(np.maximum(r, g), np.maximum(b, 0)))
+        L = L / scaleL
+        L_toe = _toe(L)
+        v = np.where(L_v != 0, L_toe / L_v, 0)
+        s = (S0 + T_max) * C_v / (T_max * S0 + T_max * k * C_v)
+    v = np.where(np.isfinite(v), v, 0)
+    s = np.where(np.isfinite(s) & (C_val != 0), s, 0)
+    return _stack(h, s, v)
+
+def srgbToOkhsvArray(arr):
+    return linearSrgbToOkhsvArray(srgbTransferFunctionInvArray(arr))
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, pyqtSignal
+
+PALETTES_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../userData/palettes")
+)
+PALETTE_EXTENSION = ".json"
+
+
+class CatalogEntry:
+    """
+    One palette file. size and mtime come from the directory scan; hash and
+    colorCount are filled in the first time the file is read.
+    """
+
+    __slots__ = ("name", "path", "size", "mtime", "hash", "colorCount")
+
+    def __init__(self, name, path, size, mtime):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.hash = None
+        self.colorCount = None
+
+    def matches(self, stat):
+        return self.size == stat.st_size and self.mtime == stat.st_mtime_ns
+
+
+class PaletteCatalog(QObject):
+    """
+    Index of the palette library directory.
+
+    The directory is scanned once; afterwards QFileSystemWatcher reports
+    changes and only the files whose size or mtime moved are updated.
+    Parsed palettes are kept in a bounded LRU and reused until their file
+    changes, which getPalette checks with a stat since the directory watch
+    does not see files rewritten in place. Reads may happen on worker threads, so the index and the cache
+    are guarded by a lock.
+    """
+
+    # emitted after the set of palettes or any of their files changed
+    changed = pyqtSignal()
+
+    def __init__(self, directory=PALETTES_DIR, maxParsed=64, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.maxParsed = maxParsed
+        self._entries = {}
+        self._parsed = OrderedDict()
+        self._lock = Lock()
+        self.rescan()
+        self.watcher = QFileSystemWatcher([directory], self)
+        self.watcher.directoryChanged.connect(self.rescan)
+
+    def rescan(self, *args):
+        """
+        Bring the index in line with the directory, touching only files
+        that were added, removed or modified.
+        """
+        seen = set()
+        dirty = False
+        with os.scandir(self.directory) as files:
+            for file in files:
+                if not file.name.endswith(PALETTE_EXTENSION) or not file.is_file():
+                    continue
+                name = file.name[: -len(PALETTE_EXTENSION)]
+                try:
+                    stat = file.stat()
+                except OSError:
+                    # removed while scanning; the watcher fires again
+                    continue
+                seen.add(name)
+                with self._lock:
+                    entry = self._entries.get(name)
+                    if entry is not None and entry.matches(stat):
+                        continue
+                    self._entries[name] = CatalogEntry(
+                        name, file.path, stat.st_size, stat.st_mtime_ns
+                    )
+                    self._parsed.pop(name, None)
+                dirty = True
+        with self._lock:
+            for name in [n for n in self._entries if n not in seen]:
+                del self._entries[name]
+                self._parsed.pop(name, None)
+                dirty = True
+        if dirty:
+            self.changed.emit()
+
+    def names(self):
+        with self._lock:
+            return sorted(self._entries)
+
+    def entry(self, name):
+        with self._lock:
+            return self._entries.get(name)
+
+    def getPalette(self, name):
+        """
+        Parsed palette file ({"name": ..., "palette": ...}), read from disk
+        only when it is not cached or the file changed since.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                raise FileNotFoundError(f"No palette named {name}")
+        # the directory watcher misses in-place rewrites of existing files
+        stat = os.stat(entry.path)
+        with self._lock:
+            stale = not entry.matches(stat)
+            if stale:
+                entry = CatalogEntry(name, entry.path, stat.st_size, stat.st_mtime_ns)
+                self._entries[name] = entry
+                self._parsed.pop(name, None)
+            palette = self._parsed.get(name)
+            if palette is not None:
+                self._parsed.move_to_end(name)
+                return palette
+        if stale:
+            self.changed.emit()
+        with open(entry.path, "rb") as jsonFile:
+            data = jsonFile.read()
+        palette = json.loads(data)
+        with self._lock:
+            entry.hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+            entry.colorCount = sum(
+                1 for row in palette["palette"] for rgb in row if rgb is not None
+            )
+            self._parsed[name] = palette
+            while len(self._parsed) > self.maxParsed:
+                self._parsed.popitem(last=False)
+        return palette
+
+    def details(self, name):
+        """
+        The entry with hash and colorCount filled in, current with the file.
+        """
+        if self.entry(name) is None:
+            return None
+        self.getPalette(name)
+        return self.entry(name)
+
+
+_catalog = None
+
+
+def paletteCatalog():
+    """
+    The shared catalog of the palette library, created on first use.
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = PaletteCatalog()
+    return _catalog
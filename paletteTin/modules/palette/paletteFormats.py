@@ -0,0 +1,305 @@
+"""
+Streaming readers and writers for Krita (.kpl), GIMP (.gpl) and Adobe
+Swatch Exchange (.ase) palettes.
+
+Readers are generators of PaletteEntry and never hold a whole document:
+colorset.xml is walked with iterparse and every finished entry is cleared,
+.gpl is read line by line and .ase block by block. readPage() lays the
+entries out on the docker's grid one page at a time, so a vendor palette
+with thousands of colors is paged into the grid rather than loaded at
+once. Unpositioned formats stop reading as soon as the page is full;
+.kpl entries carry positions in no guaranteed order (Krita writes them
+column by column), so only their positions and colors are collected
+before the page is laid out.
+"""
+
+import os
+import struct
+import zipfile
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import quoteattr
+
+from ..transfer.transfer import encode8
+
+# row and col are None when the format has no fixed position; .kpl rows
+# are absolute, with each group's rows following the ones before it
+PaletteEntry = namedtuple("PaletteEntry", ["name", "rgb", "row", "col"])
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "paletteTemplate")
+KPL_MIMETYPE = b"krita/x-colorset"
+ASE_SIGNATURE = b"ASEF"
+ASE_COLOR = 0x0001
+ASE_GROUP_START = 0xC001
+ASE_GROUP_END = 0xC002
+ASE_BLOCK = struct.Struct(">HI")
+
+# CIE Lab D50 white point and XYZ D50 to linear sRGB (Bradford adapted)
+D50_WHITE = (0.96422, 1.0, 0.82521)
+XYZ_D50_TO_SRGB = (
+    (3.1338561, -1.6168667, -0.4906146),
+    (-0.9787684, 1.9161415, 0.0334540),
+    (0.0719453, -0.2289914, 1.4052427),
+)
+
+
+def to8(value):
+    return min(max(round(value * 255), 0), 255)
+
+
+def labToRgb8(L, a, b):
+    fy = (L + 16) / 116
+    fx = fy + a / 500
+    fz = fy - b / 200
+
+    def finv(t):
+        return t ** 3 if t > 6 / 29 else 3 * (6 / 29) ** 2 * (t - 4 / 29)
+
+    xyz = (D50_WHITE[0] * finv(fx), D50_WHITE[1] * finv(fy), D50_WHITE[2] * finv(fz))
+    return tuple(
+        encode8(min(max(sum(m * v for m, v in zip(row, xyz)), 0.0), 1.0))
+        for row in XYZ_D50_TO_SRGB
+    )
+
+
+def _rows(elem):
+    try:
+        return int(elem.get("rows", 0))
+    except ValueError:
+        return 0
+
+
+def readKpl(path):
+    """
+    Entries of a Krita .kpl (zip with colorset.xml). Only RGB entries
+    are read; other color models are skipped. Positions inside a <Group>
+    are relative to the group, which starts below the main set and every
+    earlier group.
+    """
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("colorset.xml") as stream:
+            parents = []
+            # first row of the group being read, and rows used so far
+            offset = 0
+            usedRows = 0
+            for event, elem in iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if not parents:
+                        usedRows = _rows(elem)
+                        parents.append(elem)
+                    elif elem.tag == "Group":
+                        offset = usedRows
+                        usedRows = offset + _rows(elem)
+                        parents.append(elem)
+                    continue
+                if elem.tag == "Group":
+                    parents.pop()
+                    parents[-1].clear()
+                    continue
+                if elem.tag != "ColorSetEntry":
+                    continue
+                rgb = elem.find("RGB")
+                position = elem.find("Position")
+                if rgb is not None:
+                    row = col = None
+                    if position is not None:
+                        row = offset + int(position.get("row"))
+                        col = int(position.get("column"))
+                        usedRows = max(usedRows, row + 1)
+                    yield PaletteEntry(
+                        elem.get("name", ""),
+                        (to8(float(rgb.get("r"))), to8(float(rgb.get("g"))), to8(float(rgb.get("b")))),
+                        row,
+                        col,
+                    )
+                # drop the finished entry so memory stays flat
+                if parents:
+                    parents[-1].clear()
+
+
+def readGpl(path):
+    """
+    Entries of a GIMP .gpl palette: "R G B name" lines after the header.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as stream:
+        header = stream.readline()
+        if not header.startswith("GIMP Palette"):
+            raise ValueError(f"{path} is not a GIMP palette")
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith("#") or ":" in line.split(None, 1)[0]:
+                continue
+            parts = line.split(None, 3)
+            if len(parts) < 3:
+                continue
+            try:
+                rgb = tuple(min(max(int(v), 0), 255) for v in parts[:3])
+            except ValueError:
+                continue
+            yield PaletteEntry(parts[3] if len(parts) > 3 else "", rgb, None, None)
+
+
+def readAse(path):
+    """
+    Color entries of an Adobe Swatch Exchange file, one block read at a
+    time. Groups are flattened; RGB, Gray, CMYK and Lab are converted to
+    8-bit sRGB.
+    """
+    with open(path, "rb") as stream:
+        if stream.read(4) != ASE_SIGNATURE:
+            raise ValueError(f"{path} is not an ASE file")
+        _, _, blocks = struct.unpack(">HHI", stream.read(8))
+        for _ in range(blocks):
+            header = stream.read(ASE_BLOCK.size)
+            if len(header) < ASE_BLOCK.size:
+                break
+            blockType, length = ASE_BLOCK.unpack(header)
+            block = stream.read(length)
+            if blockType != ASE_COLOR:
+                continue
+            (nameLength,) = struct.unpack_from(">H", block)
+            end = 2 + nameLength * 2
+            name = block[2:end].decode("utf-16-be").rstrip("\x00")
+            model = block[end:end + 4]
+            values = block[end + 4:]
+            if model == b"RGB ":
+                r, g, b = struct.unpack_from(">3f", values)
+                rgb = (to8(r), to8(g), to8(b))
+            elif model == b"Gray":
+                (v,) = struct.unpack_from(">f", values)
+                rgb = (to8(v),) * 3
+            elif model == b"CMYK":
+                c, m, y, k = struct.unpack_from(">4f", values)
+                rgb = (to8((1 - c) * (1 - k)), to8((1 - m) * (1 - k)), to8((1 - y) * (1 - k)))
+            elif model == b"LAB ":
+                L, a, b = struct.unpack_from(">3f", values)
+                rgb = labToRgb8(L * 100, a, b)
+            else:
+                continue
+            yield PaletteEntry(name, rgb, None, None)
+
+
+READERS = {".kpl": readKpl, ".gpl": readGpl, ".ase": readAse}
+# formats whose entries carry grid positions in arbitrary file order
+POSITIONED = {".kpl"}
+
+
+def readEntries(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported palette format: {extension}")
+    return READERS[extension](path)
+
+
+def readPage(path, rows, cols, page=0):
+    """
+    One rows x cols page of a palette file as nested [r, g, b] / None rows.
+
+    Unpositioned entries fill the grid in reading order, and reading stops
+    once the page is full. Positioned entries are ordered by row and
+    column: they keep their place when the whole file fits the grid width,
+    and are re-flowed row major otherwise. Unpositioned entries of a
+    positioned format follow them in file order.
+
+    Returns:
+        tuple: (palette, hasMore) where hasMore says whether a later page
+        has entries.
+    """
+    size = rows * cols
+    first = page * size
+    palette = [[None] * cols for _ in range(rows)]
+    extension = os.path.splitext(path)[1].lower()
+    if extension in POSITIONED:
+        indexed = _layout(readEntries(path), cols)
+    else:
+        indexed = enumerate(entry.rgb for entry in readEntries(path))
+    for index, rgb in indexed:
+        if index >= first + size:
+            return palette, True
+        if index >= first:
+            r, c = divmod(index - first, cols)
+            palette[r][c] = list(rgb)
+    return palette, False
+
+
+def _layout(entries, cols):
+    # (grid index, rgb) in index order for entries in arbitrary file order
+    placed = []
+    loose = []
+    for entry in entries:
+        if entry.row is None or entry.col is None:
+            loose.append(entry.rgb)
+        else:
+            placed.append((entry.row, entry.col, entry.rgb))
+    placed.sort(key=lambda item: (item[0], item[1]))
+    if all(col < cols for _, col, _ in placed):
+        indexed = [(row * cols + col, rgb) for row, col, rgb in placed]
+    else:
+        indexed = list(enumerate(rgb for _, _, rgb in placed))
+    start = indexed[-1][0] + 1 if indexed else 0
+    indexed.extend(enumerate(loose, start))
+    return indexed
+
+
+def _colors(palette):
+    # non-empty cells of a nested palette, row major
+    for r, row in enumerate(palette):
+        for c, rgb in enumerate(row):
+            if rgb is not None:
+                yield r, c, rgb
+
+
+def writeKpl(path, palette, name):
+    rows = len(palette)
+    cols = max((len(row) for row in palette), default=0)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        # the mimetype comes first and uncompressed, as in Krita's own files
+        archive.writestr("mimetype", KPL_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        with archive.open("colorset.xml", "w") as stream:
+            stream.write(
+                f'<ColorSet version="2.0" rows="{rows}" columns="{cols}" '
+                f'name={quoteattr(name)} comment="">\n'.encode()
+            )
+            for i, (r, c, rgb) in enumerate(_colors(palette)):
+                stream.write(
+                    f'  <ColorSetEntry spot="true" id="{i}" name="" bitdepth="U8">\n'
+                    f'    <RGB space="sRGB built-in" r="{rgb[0] / 255}" '
+                    f'g="{rgb[1] / 255}" b="{rgb[2] / 255}"/>\n'
+                    f'    <Position row="{r}" column="{c}"/>\n'
+                    "  </ColorSetEntry>\n".encode()
+                )
+            stream.write(b"</ColorSet>\n")
+        archive.write(os.path.join(TEMPLATE_DIR, "profiles.xml"), "profiles.xml")
+
+
+def writeGpl(path, palette, name):
+    cols = max((len(row) for row in palette), default=0)
+    with open(path, "w", encoding="utf-8") as stream:
+        stream.write(f"GIMP Palette\nName: {name}\nColumns: {cols}\n#\n")
+        for _, _, rgb in _colors(palette):
+            stream.write(f"{rgb[0]:3d} {rgb[1]:3d} {rgb[2]:3d}\t#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}\n")
+
+
+def writeAse(path, palette, name):
+    colors = list(_colors(palette))
+    with open(path, "wb") as stream:
+        stream.write(ASE_SIGNATURE + struct.pack(">HHI", 1, 0, len(colors)))
+        for _, _, rgb in colors:
+            label = f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}\x00".encode("utf-16-be")
+            body = (
+                struct.pack(">H", len(label) // 2)
+                + label
+                + b"RGB "
+                + struct.pack(">3fH", rgb[0] / 255, rgb[1] / 255, rgb[2] / 255, 2)
+            )
+            stream.write(ASE_BLOCK.pack(ASE_COLOR, len(body)) + body)
+
+
+WRITERS = {".kpl": writeKpl, ".gpl": writeGpl, ".ase": writeAse}
+
+
+def writePalette(path, palette, name):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported palette format: {extension}")
+    WRITERS[extension](path, palette, name)
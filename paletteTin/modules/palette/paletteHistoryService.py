@@ -1,35 +1,156 @@
-# stacklimit is not working, is unding n-1 not n
+from array import array
+from collections import deque
+
+from ...paletteModel import changedCells
+
+# default memory budget for one history, in bytes
+DEFAULT_BUDGET = 256 * 1024
+# every Nth entry keeps full snapshots so long undo runs cannot drift
+KEYFRAME_INTERVAL = 64
+# rough per-entry bookkeeping cost (tuple, bytes headers) added to the budget
+ENTRY_OVERHEAD = 120
+
+
 class PaletteHistoryService:
-    def __init__(self, stackLimit=5):
-        self.history = []
-        self.currentIndex = -1  # Tracks where we are in the history
-        self.stackLimit = stackLimit
-
-    def appendPalette(self, palette):
-        if len(self.history) >= self.stackLimit:
-            self.history.pop(0)  # Remove the oldest palette
-            self.currentIndex = self.stackLimit - 2
-        
-        self.history.append(palette)
-        self.currentIndex += 1 
-
-    def updateStackLimit(self, newLimit: int):
-        self.stackLimit = newLimit
-
-    def getLastPalettes(self):
-        return self.history
-    
-    def toString(self):
-        print(self.currentIndex)
+    """
+    Undo/redo over PaletteModel snapshots, stored as per-cell deltas.
 
-    def reset(self):
-        self.history = []
-        self.currentIndex = -1
+    A snapshot is 3 RGB bytes per cell followed by one flag byte per cell.
+    appendPalette diffs the new snapshot against the current one and keeps
+    only the changed cells as (cell indices, old cell bytes, new cell bytes),
+    4 bytes per cell on each side. Every KEYFRAME_INTERVAL entries, and
+    whenever a delta would not be smaller, the entry keeps the full before
+    and after snapshots instead.
+
+    Entries sit in deques, so appending and evicting the oldest are O(1).
+    Eviction is driven by a byte budget rather than an entry count. Undo
+    and redo entries share the budget; when it is exceeded the redo entry
+    furthest from the current state goes first, then the oldest undo.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.undoEntries = deque()
+        self.redoEntries = deque()
+        self.current = None
+        self.usedBytes = 0
+        self._sinceKeyframe = 0
+
+    def appendPalette(self, snapshot):
+        """
+        Record snapshot as the new current state. The first snapshot after a
+        reset only sets the base state; identical snapshots are ignored.
+        Any redo entries are dropped.
+        """
+        snapshot = bytes(snapshot)
+        if self.current is None:
+            self.current = snapshot
+            return
+        if snapshot == self.current:
+            return
+        entry = self._entry(self.current, snapshot)
+        self.current = snapshot
+        self.usedBytes -= sum(self._entrySize(e) for e in self.redoEntries)
+        self.redoEntries.clear()
+        self._push(entry)
 
     def returnPreviousPalette(self):
-        if len(self.history) <= 1:
-            return None  # No palettes in history
-        self.history.pop(self.currentIndex)
-        self.currentIndex -= 1
-        palette = self.history[self.currentIndex]
-        return palette
\ No newline at end of file
+        """
+        Step back one entry and return that snapshot, or None at the oldest.
+        """
+        if not self.undoEntries:
+            return None
+        # the entry changes sides but stays counted against the budget
+        entry = self.undoEntries.pop()
+        self.redoEntries.append(entry)
+        self.current = self._apply(self.current, entry, undo=True)
+        return self.current
+
+    def returnNextPalette(self):
+        """
+        Redo the last undone entry and return that snapshot, or None.
+        """
+        if not self.redoEntries:
+            return None
+        entry = self.redoEntries.pop()
+        self.current = self._apply(self.current, entry, undo=False)
+        self.undoEntries.append(entry)
+        return self.current
+
+    def canUndo(self):
+        return bool(self.undoEntries)
+
+    def canRedo(self):
+        return bool(self.redoEntries)
+
+    def setBudget(self, budget):
+        self.budget = budget
+        self._evict()
+
+    def reset(self):
+        self.undoEntries.clear()
+        self.redoEntries.clear()
+        self.current = None
+        self.usedBytes = 0
+        self._sinceKeyframe = 0
+
+    def toString(self):
+        return (
+            f"{len(self.undoEntries)} undo, {len(self.redoEntries)} redo, "
+            f"{self.usedBytes}/{self.budget} bytes"
+        )
+
+    def _push(self, entry):
+        self.undoEntries.append(entry)
+        self.usedBytes += self._entrySize(entry)
+        self._evict()
+
+    def _evict(self):
+        while self.usedBytes > self.budget and self.redoEntries:
+            self.usedBytes -= self._entrySize(self.redoEntries.popleft())
+        while self.usedBytes > self.budget and self.undoEntries:
+            self.usedBytes -= self._entrySize(self.undoEntries.popleft())
+
+    def _entrySize(self, entry):
+        cells, old, new = entry
+        size = ENTRY_OVERHEAD + len(old) + len(new)
+        if cells is not None:
+            size += len(cells) * cells.itemsize
+        return size
+
+    def _entry(self, before, after):
+        self._sinceKeyframe += 1
+        if len(before) != len(after) or self._sinceKeyframe >= KEYFRAME_INTERVAL:
+            self._sinceKeyframe = 0
+            return (None, before, after)
+        split = len(after) // 4 * 3
+        cells = array("I", changedCells(
+            before[:split], before[split:], after[:split], after[split:]
+        ))
+        old = bytearray()
+        new = bytearray()
+        for i in cells:
+            o = i * 3
+            old += before[o:o + 3]
+            old.append(before[split + i])
+            new += after[o:o + 3]
+            new.append(after[split + i])
+        # a delta covering most of the grid is no smaller than a keyframe
+        if len(old) >= len(before):
+            self._sinceKeyframe = 0
+            return (None, before, after)
+        return (cells, bytes(old), bytes(new))
+
+    def _apply(self, snapshot, entry, undo):
+        cells, old, new = entry
+        values = old if undo else new
+        if cells is None:
+            return values
+        state = bytearray(snapshot)
+        count = len(state) // 4
+        for k, i in enumerate(cells):
+            o = i * 3
+            v = k * 4
+            state[o:o + 3] = values[v:v + 3]
+            state[count * 3 + i] = values[v + 3]
+        return bytes(state)
@@ -1,8 +1,11 @@
 from krita import Krita
 import os
 import json
+import hashlib
+from PyQt5.QtCore import QPoint, QSize, Qt, QTimer
+from PyQt5.QtGui import QIcon, QPixmap
 from PyQt5.QtWidgets import (
-    QComboBox,
+    QListWidget,
     QLabel,
     QHBoxLayout,
     QDialog,
@@ -14,44 +17,93 @@ from PyQt5.QtWidgets import (
     QMessageBox,
 )
 
+from .paletteCatalog import PALETTES_DIR, PALETTE_EXTENSION, paletteCatalog
+from .paletteFormats import readPage, writePalette
+from .paletteStore import packPalette
+from .paletteThumbnails import THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, thumbnailCache
+from ...mixWorker import MixExecutor
+
+PALETTE_FILE_FILTER = "Palettes (*.kpl *.gpl *.ase)"
+EXPORT_FILE_FILTER = "Krita palette (*.kpl);;GIMP palette (*.gpl);;Adobe swatch exchange (*.ase)"
+
 
 class PaletteService:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, store=None) -> None:
+        # optional PaletteStore; when set it is the library instead of the
+        # JSON directory, which remains the target of exports
+        self.store = store
+        self.catalog = paletteCatalog()
 
     def getPaletteAsJSON(self, paletteName):
-        baseDir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
-        palettePath = os.path.join(
-            baseDir, "userData", "palettes", f"{paletteName}.json"
-        )
-        with open(palettePath, "r") as jsonFile:
-            palette = json.load(jsonFile)
-        return palette
+        if self.store is not None:
+            return self.store.getPalette(paletteName)
+        # parsed once by the catalog and reused until the file changes
+        return self.catalog.getPalette(paletteName)
 
     def savePaletteAsJSON(self, jsonName, paletteData, exportPath=""):
-        baseDir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
         if jsonName == "_default":
             return False, "Can't overwrite the default palette for now"
+        if self.store is not None and not exportPath:
+            if not self.store.savePalette(jsonName, paletteData, overwrite=False):
+                return False, "Palette name already exists."
+            return True, "Palette has been successfully saved."
         if exportPath:
-            paletteFile = os.path.join(exportPath, f"{jsonName}.json")
+            paletteFile = os.path.join(exportPath, f"{jsonName}{PALETTE_EXTENSION}")
         else:
-            palettesDir = os.path.join(baseDir, "userData", "palettes")
-            paletteFile = os.path.join(palettesDir, f"{jsonName}.json")
+            paletteFile = os.path.join(PALETTES_DIR, f"{jsonName}{PALETTE_EXTENSION}")
         if os.path.exists(paletteFile):
             return False, "Palette name already exists."
         data = {"name": jsonName, "palette": paletteData}
         with open(paletteFile, "w") as outfile:
             json.dump(data, outfile, indent=4)
+        if not exportPath:
+            self.catalog.rescan()
         return True, "Palette has been successfully saved."
 
+    def importPalettePage(self, path, rows, cols, page=0):
+        """
+        One grid-sized page of a .kpl, .gpl or .ase file, read only as far
+        as that page. Returns (palette, hasMore).
+        """
+        return readPage(path, rows, cols, page)
+
+    def exportPalette(self, path, paletteData, name):
+        try:
+            writePalette(path, paletteData, name)
+        except (OSError, ValueError) as e:
+            return False, str(e)
+        return True, "Palette has been successfully exported."
+
+    def thumbnailSource(self, name):
+        """
+        A callable returning (hash, rgb, empty) for the palette, safe to run
+        on a worker thread. Library files are hashed as stored on disk;
+        store rows are read here, since the SQLite connection belongs to
+        the GUI thread, and hashed on the worker.
+        """
+        if self.store is not None:
+            rows, cols, rgb, empty = self.store.getPacked(name)
+
+            def fromStore():
+                digest = hashlib.blake2b(digest_size=16)
+                digest.update(f"{rows}x{cols}".encode())
+                digest.update(rgb)
+                digest.update(empty)
+                return digest.hexdigest(), rgb, empty
+
+            return fromStore
+
+        def fromCatalog():
+            palette = self.catalog.getPalette(name)["palette"]
+            _, _, rgb, empty = packPalette(palette)
+            return self.catalog.details(name).hash, rgb, empty
+
+        return fromCatalog
+
     def getPaletteList(self):
-        baseDir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
-        palettesDir = os.path.join(baseDir, "userData", "palettes")
-        filenames = os.listdir(palettesDir)
-        jsonFilenames = [
-            os.path.splitext(file)[0] for file in filenames if file.endswith(".json")
-        ]
-        return jsonFilenames
+        if self.store is not None:
+            return self.store.names()
+        return self.catalog.names()
 
 
 class SavePaletteDialog(QDialog):
@@ -59,7 +111,7 @@ class SavePaletteDialog(QDialog):
         super().__init__(parent)
         self.resize(200, 80)
         self.setWindowTitle(title)
-        self.ps = PaletteService()
+        self.ps = parent.ps
         self.setUI()
 
     def setUI(self):
@@ -81,8 +133,24 @@ class SavePaletteDialog(QDialog):
         self.mainContainer.addWidget(self.paletteName)
         self.mainContainer.addWidget(self.buttonWidget)
         self.buttonContainer.addWidget(self.buttonSave)
+        self.buttonContainer.addWidget(self.buttonExport)
 
         self.buttonSave.clicked.connect(lambda: self.savePaletteJSON(""))
+        self.buttonExport.clicked.connect(self.exportPalette)
+
+    def exportPalette(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Palette", self.paletteName.text().strip(), EXPORT_FILE_FILTER
+        )
+        if not path:
+            return False
+        name = self.paletteName.text().strip() or os.path.splitext(os.path.basename(path))[0]
+        success, message = self.ps.exportPalette(path, self.parent().swatchRGB, name)
+        if not success:
+            QMessageBox.warning(self, "Error", f"Error: {message}")
+            return False
+        QMessageBox.information(self, "Success", message)
+        return True
 
     def savePaletteJSON(self, exportPath=""):
         doc = Krita.instance().activeDocument()
@@ -116,7 +184,6 @@ class SavePaletteDialog(QDialog):
             QMessageBox.warning(self, "Error", f"Error: {message}")
             return False
 
-        self.parent().updatePaletteTrayDropdown()
         QMessageBox.information(self, "Success", message)
         self.done(0)
         return True
@@ -141,24 +208,114 @@ class LoadPaletteDialog(QDialog):
         self.buttonWidget.setLayout(self.buttonContainer)
         self.buttonContainer.setContentsMargins(0, 0, 0, 0)
 
-        self.paletteTrayDropdown = QComboBox()
-        self.paletteTrayDropdown.addItems(self.ps.getPaletteList())
-        self.paletteTrayDropdown.setCurrentIndex(0)
-        self.paletteTrayDropdown.setMaximumWidth(60)
+        # thumbnails are requested only for rows scrolled into view and
+        # stream in from a worker as they are rendered or read from disk
+        self.thumbnails = thumbnailCache()
+        self.thumbnailExecutor = MixExecutor(self, maxThreads=1)
+        self.requestedThumbnails = set()
+
+        self.paletteList = QListWidget()
+        self.paletteList.setIconSize(QSize(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+        self.paletteList.setUniformItemSizes(True)
+        self.paletteList.setMinimumWidth(THUMBNAIL_WIDTH + 100)
+        self.paletteList.addItems(self.ps.getPaletteList())
+        self.paletteList.setCurrentRow(0)
+        self.paletteList.itemDoubleClicked.connect(self.load)
+        self.paletteList.verticalScrollBar().valueChanged.connect(
+            self.requestVisibleThumbnails
+        )
+        self.ps.catalog.changed.connect(self.refreshPaletteList)
 
         self.buttonLoad = QPushButton("Load")
         self.buttonLoad.clicked.connect(self.load)
 
-        self.mainContainer.addWidget(self.paletteTrayDropdown)
+        # .kpl/.gpl/.ase files are paged into the grid one screenful at a time
+        self.importPath = None
+        self.importPage = 0
+        self.buttonImport = QPushButton("Import")
+        self.buttonImport.clicked.connect(self.importPalette)
+        self.buttonNextPage = QPushButton("Next page")
+        self.buttonNextPage.clicked.connect(lambda: self.loadImportPage(self.importPage + 1))
+        self.buttonNextPage.setEnabled(False)
+
+        self.mainContainer.addWidget(self.paletteList)
         self.mainContainer.addWidget(self.buttonLoad)
+        self.mainContainer.addWidget(self.buttonImport)
+        self.mainContainer.addWidget(self.buttonNextPage)
+
+    def showEvent(self, e):
+        # store saves do not go through the catalog's watcher
+        self.refreshPaletteList()
+        super().showEvent(e)
+
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        self.requestVisibleThumbnails()
+
+    def refreshPaletteList(self):
+        current = self.paletteList.currentItem()
+        current = current.text() if current is not None else None
+        self.thumbnailExecutor.cancelAll()
+        self.requestedThumbnails.clear()
+        self.paletteList.clear()
+        self.paletteList.addItems(self.ps.getPaletteList())
+        matches = self.paletteList.findItems(current, Qt.MatchExactly) if current else []
+        self.paletteList.setCurrentRow(self.paletteList.row(matches[0]) if matches else 0)
+        # after the list has been laid out, so the visible rows are known
+        QTimer.singleShot(0, self.requestVisibleThumbnails)
+
+    def requestVisibleThumbnails(self, *args):
+        count = self.paletteList.count()
+        if not count or not self.isVisible():
+            return
+        viewport = self.paletteList.viewport()
+        first = self.paletteList.indexAt(QPoint(0, 0)).row()
+        last = self.paletteList.indexAt(QPoint(0, viewport.height() - 1)).row()
+        first = max(first, 0)
+        last = count - 1 if last < 0 else last
+        for row in range(first, last + 1):
+            name = self.paletteList.item(row).text()
+            if name in self.requestedThumbnails:
+                continue
+            self.requestedThumbnails.add(name)
+            try:
+                source = self.ps.thumbnailSource(name)
+            except KeyError:
+                continue
+            self.thumbnailExecutor.submit(
+                ("thumbnail", name),
+                lambda source=source: self.thumbnails.thumbnail(*source()),
+                lambda image, name=name: self.setThumbnail(name, image),
+            )
+
+    def setThumbnail(self, name, image):
+        for item in self.paletteList.findItems(name, Qt.MatchExactly):
+            item.setIcon(QIcon(QPixmap.fromImage(image)))
 
-    def load(self):
-        palette_name = self.paletteTrayDropdown.currentText()
+    def load(self, *args):
+        item = self.paletteList.currentItem()
+        if item is not None:
+            self.parent.loadPaletteByName(item.text())
+
+    def importPalette(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import Palette", "", PALETTE_FILE_FILTER
+        )
+        if path:
+            self.importPath = path
+            self.loadImportPage(0)
+
+    def loadImportPage(self, page):
         try:
-            self.parent.swatchRGB = self.ps.getPaletteAsJSON(palette_name)["palette"]
-            self.parent.history.appendPalette(self.parent.swatchRGB)
-        except Exception:
-            print("Error executing loading palette does not exists or empty")
+            palette, hasMore = self.ps.importPalettePage(
+                self.importPath, self.parent.gridCount, self.parent.colorCount, page
+            )
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"Error: {e}")
+            return
+        self.importPage = page
+        self.buttonNextPage.setEnabled(hasMore)
+        self.parent.applyPalette(palette)
 
 
 class HelpDialog(QDialog):
@@ -189,5 +346,12 @@ class HelpDialog(QDialog):
 
             Alternatively, you can always delete with Shift + Right click.
 
+            Ctrl + Right click fills a row with a ramp between its end
+            swatches; the gradient button fills every row.
+
+            The load dialog previews every palette; double-click one
+            to load it. Load > Import reads .kpl, .gpl and .ase palettes one grid
+            page at a time; Save > Export writes the grid in those formats.
+
             """)
         self.mainContainer.addWidget(self.label)
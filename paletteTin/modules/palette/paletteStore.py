@@ -0,0 +1,303 @@
+"""
+SQLite palette library.
+
+Each palette is one row: the grid packed as an RGB blob plus an empty-cell
+blob (one byte per cell), timestamps and summary statistics (color count,
+mean Oklab, a 12-bin Oklab hue histogram and its dominant bin). Tags live
+in their own table. Listing, filtering and sorting run on indexed columns
+and never touch the color blobs.
+
+The store is optional; the JSON directory stays the default library and
+can be imported into or exported from a store at any time.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import time
+
+from ..engine.derivedColor import DerivedColor
+from .paletteCatalog import PALETTES_DIR, PALETTE_EXTENSION
+
+DEFAULT_STORE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../userData/palettes.sqlite3")
+)
+HUE_BINS = 12
+# colors closer to gray than this Oklab chroma have no meaningful hue
+HUE_MIN_CHROMA = 0.02
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS palettes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    rgb BLOB NOT NULL,
+    empty BLOB NOT NULL,
+    created REAL NOT NULL,
+    modified REAL NOT NULL,
+    colorCount INTEGER NOT NULL,
+    meanL REAL,
+    meanA REAL,
+    meanB REAL,
+    hueHistogram BLOB NOT NULL,
+    dominantHue INTEGER
+);
+CREATE INDEX IF NOT EXISTS palettesModified ON palettes (modified);
+CREATE INDEX IF NOT EXISTS palettesMeanL ON palettes (meanL);
+CREATE INDEX IF NOT EXISTS palettesDominantHue ON palettes (dominantHue);
+CREATE INDEX IF NOT EXISTS palettesColorCount ON palettes (colorCount);
+CREATE TABLE IF NOT EXISTS tags (
+    paletteId INTEGER NOT NULL REFERENCES palettes (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (tag, paletteId)
+);
+CREATE INDEX IF NOT EXISTS tagsPalette ON tags (paletteId);
+"""
+
+# sortable listing columns, so orderBy never reaches the SQL unchecked
+ORDER_COLUMNS = {
+    "name": "name",
+    "modified": "modified DESC",
+    "created": "created DESC",
+    "lightness": "meanL",
+    "hue": "dominantHue",
+    "colors": "colorCount DESC",
+}
+
+
+def packPalette(palette):
+    """
+    Nested [r, g, b] / None rows to (rows, cols, rgb bytes, empty bytes).
+    Short rows are padded with empty cells.
+    """
+    rows = len(palette)
+    cols = max((len(row) for row in palette), default=0)
+    rgb = bytearray(rows * cols * 3)
+    empty = bytearray(b"\x01") * (rows * cols)
+    for r, row in enumerate(palette):
+        for c, color in enumerate(row):
+            if color is not None:
+                i = r * cols + c
+                rgb[i * 3:i * 3 + 3] = bytes((color[0], color[1], color[2]))
+                empty[i] = 0
+    return rows, cols, bytes(rgb), bytes(empty)
+
+
+def unpackPalette(rows, cols, rgb, empty):
+    palette = []
+    for r in range(rows):
+        row = []
+        for c in range(cols):
+            i = r * cols + c
+            row.append(None if empty[i] else list(rgb[i * 3:i * 3 + 3]))
+        palette.append(row)
+    return palette
+
+
+def paletteSummary(rgb, empty):
+    """
+    Color count, mean Oklab (None when empty) and hue histogram of a packed
+    palette. Duplicate colors count once per cell.
+    """
+    histogram = [0] * HUE_BINS
+    L = a = b = 0.0
+    count = 0
+    for i, isEmpty in enumerate(empty):
+        if isEmpty:
+            continue
+        lab = DerivedColor(rgb[i * 3:i * 3 + 3]).oklab
+        L += lab.L
+        a += lab.a
+        b += lab.b
+        count += 1
+        if math.hypot(lab.a, lab.b) >= HUE_MIN_CHROMA:
+            hue = math.atan2(lab.b, lab.a) % (2 * math.pi)
+            histogram[int(hue / (2 * math.pi) * HUE_BINS) % HUE_BINS] += 1
+    mean = (L / count, a / count, b / count) if count else (None, None, None)
+    return count, mean, histogram
+
+
+class PaletteStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def savePalette(self, name, palette, tags=(), overwrite=True):
+        """
+        Insert or replace a palette given as nested rows, keeping its
+        creation time when it already exists. Returns False if the name is
+        taken and overwrite is off.
+        """
+        with self.db:
+            return self._save(name, palette, tags, overwrite)
+
+    def _save(self, name, palette, tags, overwrite):
+        # runs inside the caller's transaction
+        existing = self.db.execute(
+            "SELECT id FROM palettes WHERE name = ?", (name,)
+        ).fetchone()
+        if existing is not None and not overwrite:
+            return False
+        rows, cols, rgb, empty = packPalette(palette)
+        count, (L, A, B), histogram = paletteSummary(rgb, empty)
+        dominant = max(range(HUE_BINS), key=histogram.__getitem__) if any(histogram) else None
+        now = time.time()
+        values = (rows, cols, rgb, empty, now, count, L, A, B, bytes(histogram), dominant)
+        if existing is None:
+            cursor = self.db.execute(
+                "INSERT INTO palettes (rows, cols, rgb, empty, modified, colorCount,"
+                " meanL, meanA, meanB, hueHistogram, dominantHue, created, name)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values + (now, name),
+            )
+            paletteId = cursor.lastrowid
+        else:
+            paletteId = existing["id"]
+            self.db.execute(
+                "UPDATE palettes SET rows = ?, cols = ?, rgb = ?, empty = ?,"
+                " modified = ?, colorCount = ?, meanL = ?, meanA = ?, meanB = ?,"
+                " hueHistogram = ?, dominantHue = ? WHERE id = ?",
+                values + (paletteId,),
+            )
+        if tags:
+            self._setTags(paletteId, tags)
+        return True
+
+    def getPalette(self, name):
+        """
+        {"name": ..., "palette": nested rows}, like a palette JSON file.
+        """
+        return {"name": name, "palette": unpackPalette(*self.getPacked(name))}
+
+    def getPacked(self, name):
+        """
+        (rows, cols, rgb, empty) of a palette without unpacking it.
+        """
+        row = self.db.execute(
+            "SELECT rows, cols, rgb, empty FROM palettes WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No palette named {name}")
+        return row["rows"], row["cols"], row["rgb"], row["empty"]
+
+    def deletePalette(self, name):
+        with self.db:
+            self.db.execute("DELETE FROM palettes WHERE name = ?", (name,))
+
+    def setTags(self, name, tags):
+        with self.db:
+            row = self.db.execute(
+                "SELECT id FROM palettes WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"No palette named {name}")
+            self._setTags(row["id"], tags)
+
+    def _setTags(self, paletteId, tags):
+        self.db.execute("DELETE FROM tags WHERE paletteId = ?", (paletteId,))
+        self.db.executemany(
+            "INSERT OR IGNORE INTO tags (paletteId, tag) VALUES (?, ?)",
+            [(paletteId, tag) for tag in tags],
+        )
+
+    def tags(self, name):
+        return [
+            row["tag"]
+            for row in self.db.execute(
+                "SELECT tag FROM tags JOIN palettes ON palettes.id = tags.paletteId"
+                " WHERE palettes.name = ? ORDER BY tag",
+                (name,),
+            )
+        ]
+
+    def listPalettes(self, tag=None, nameContains=None, hue=None, minColors=None,
+                     orderBy="name", limit=None):
+        """
+        Summaries (name, rows, cols, colorCount, meanL, dominantHue,
+        modified) of the palettes matching every given filter.
+
+        Args:
+            tag (str): Only palettes with this tag.
+            nameContains (str): Case-insensitive substring of the name.
+            hue (int): Dominant hue bin, 0 to HUE_BINS - 1.
+            minColors (int): At least this many non-empty cells.
+            orderBy (str): One of ORDER_COLUMNS.
+            limit (int): Maximum number of rows.
+        """
+        if orderBy not in ORDER_COLUMNS:
+            raise ValueError(f"Unknown palette order: {orderBy}")
+        query = (
+            "SELECT name, rows, cols, colorCount, meanL, dominantHue, modified"
+            " FROM palettes"
+        )
+        where = []
+        args = []
+        if tag is not None:
+            where.append("id IN (SELECT paletteId FROM tags WHERE tag = ?)")
+            args.append(tag)
+        if nameContains:
+            where.append("instr(lower(name), lower(?)) > 0")
+            args.append(nameContains)
+        if hue is not None:
+            where.append("dominantHue = ?")
+            args.append(hue)
+        if minColors is not None:
+            where.append("colorCount >= ?")
+            args.append(minColors)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY " + ORDER_COLUMNS[orderBy]
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        return [dict(row) for row in self.db.execute(query, args)]
+
+    def names(self):
+        return [row["name"] for row in self.db.execute("SELECT name FROM palettes ORDER BY name")]
+
+    def importDirectory(self, directory=PALETTES_DIR, overwrite=False):
+        """
+        Import every palette JSON file of a directory; returns the number
+        imported. Existing names are skipped unless overwrite is set, and
+        unreadable or malformed files are skipped without failing the rest.
+        """
+        imported = 0
+        # one transaction for the whole directory
+        with self.db:
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(PALETTE_EXTENSION):
+                    continue
+                try:
+                    with open(os.path.join(directory, filename), "r") as jsonFile:
+                        data = json.load(jsonFile)
+                    name = data.get("name") or filename[: -len(PALETTE_EXTENSION)]
+                    saved = self._save(name, data["palette"], (), overwrite)
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    print(f"Skipping palette {filename}: {e}")
+                    continue
+                if saved:
+                    imported += 1
+        return imported
+
+    def exportDirectory(self, directory=PALETTES_DIR, overwrite=False):
+        """
+        Write every stored palette as a JSON file in the directory's usual
+        layout; returns the number written.
+        """
+        exported = 0
+        for name in self.names():
+            paletteFile = os.path.join(directory, f"{name}{PALETTE_EXTENSION}")
+            if os.path.exists(paletteFile) and not overwrite:
+                continue
+            with open(paletteFile, "w") as outfile:
+                json.dump(self.getPalette(name), outfile, indent=4)
+            exported += 1
+        return exported
@@ -0,0 +1,130 @@
+"""
+Swatch-strip thumbnails of library palettes.
+
+Thumbnails are rendered to QImage on a worker thread (QImage, unlike
+QPixmap, may be painted off the GUI thread) and kept as PNG files in an
+on-disk cache named after the palette's content hash, so an unchanged
+palette is never rendered twice, even across sessions. The cache is
+bounded by entry count and evicts the least recently used file.
+"""
+
+import os
+from collections import OrderedDict
+from threading import Lock, get_ident
+
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+THUMBNAIL_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../../userData/thumbnails")
+)
+THUMBNAIL_EXTENSION = ".png"
+THUMBNAIL_WIDTH = 120
+THUMBNAIL_HEIGHT = 16
+DEFAULT_MAX_THUMBNAILS = 1024
+EMPTY_COLOR = QColor(64, 64, 64)
+
+
+def renderThumbnail(rgb, empty, width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT):
+    """
+    A strip of the palette's non-empty colors, row major, as equal-width
+    bands. Palettes with more colors than pixels are sampled evenly.
+    """
+    colors = [rgb[i * 3:i * 3 + 3] for i, isEmpty in enumerate(empty) if not isEmpty]
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(EMPTY_COLOR)
+    if not colors:
+        return image
+    painter = QPainter(image)
+    bands = min(len(colors), width)
+    for band in range(bands):
+        color = colors[band * len(colors) // bands]
+        left = band * width // bands
+        right = (band + 1) * width // bands
+        painter.fillRect(left, 0, right - left, height, QColor(color[0], color[1], color[2]))
+    painter.end()
+    return image
+
+
+class ThumbnailCache:
+    """
+    PNG thumbnails on disk keyed by palette content hash. Recency is the
+    file mtime, so the LRU order survives restarts. Safe to use from
+    worker threads.
+    """
+
+    def __init__(self, directory=THUMBNAIL_DIR, maxEntries=DEFAULT_MAX_THUMBNAILS):
+        self.directory = directory
+        self.maxEntries = maxEntries
+        self._lock = Lock()
+        self._files = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        with os.scandir(directory) as files:
+            for file in files:
+                if file.name.endswith(THUMBNAIL_EXTENSION) and file.is_file():
+                    found.append((file.stat().st_mtime_ns, file.name[: -len(THUMBNAIL_EXTENSION)]))
+        for _, key in sorted(found):
+            self._files[key] = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key + THUMBNAIL_EXTENSION)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._files:
+                return None
+            self._files.move_to_end(key)
+        path = self.path(key)
+        image = QImage(path)
+        if image.isNull():
+            # removed or truncated behind our back
+            with self._lock:
+                self._files.pop(key, None)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def put(self, key, image):
+        path = self.path(key)
+        # write under a temporary name so readers never see half a file
+        temporary = f"{path}.{get_ident()}.tmp"
+        if not image.save(temporary, "PNG"):
+            return
+        os.replace(temporary, path)
+        with self._lock:
+            self._files[key] = None
+            self._files.move_to_end(key)
+            evicted = []
+            while len(self._files) > self.maxEntries:
+                evicted.append(self._files.popitem(last=False)[0])
+        for old in evicted:
+            try:
+                os.remove(self.path(old))
+            except OSError:
+                pass
+
+    def thumbnail(self, key, rgb, empty):
+        """
+        The cached thumbnail for key, rendering and storing it on a miss.
+        """
+        image = self.get(key)
+        if image is None:
+            image = renderThumbnail(rgb, empty)
+            self.put(key, image)
+        return image
+
+
+_cache = None
+
+
+def thumbnailCache():
+    """
+    The shared thumbnail cache, created on first use.
+    """
+    global _cache
+    if _cache is None:
+        _cache = ThumbnailCache()
+    return _cache
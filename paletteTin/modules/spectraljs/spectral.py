@@ -20,8 +20,23 @@
 ##  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 ##  DEALINGS IN THE SOFTWARE.
 
+from math import sqrt
+
+from ..transfer.transfer import (
+    DECODE_TABLE,
+    ENCODE8_THRESHOLDS,
+    decode,
+    decode8,
+    encode,
+    encode8,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 SIZE = 38
-GAMMA = 2.4
 EPSILON = 0.00000001
 
 SPD_C = [0.96853629, 0.96855103, 0.96859338, 0.96877345, 0.96942204, 0.97143709, 0.97541862, 0.98074186, 0.98580992, 0.98971194, 0.99238027, 0.99409844, 0.995172, 0.99576545, 0.99593552, 0.99564041, 0.99464769, 0.99229579, 0.98638762, 0.96829712, 0.89228016, 0.53740239, 0.15360445, 0.05705719, 0.03126539, 0.02205445, 0.01802271, 0.0161346, 0.01520947, 0.01475977, 0.01454263, 0.01444459, 0.01439897, 0.0143762, 0.01436343, 0.01435687, 0.0143537, 0.01435408]
@@ -35,56 +50,141 @@ CIE_CMF_Y = [0.00000184, 0.00000621, 0.00003101, 0.00010475, 0.00035364, 0.00095
 CIE_CMF_Z = [0.00030502, 0.00103681, 0.00531314, 0.01795439, 0.05707758, 0.11365162, 0.17335873, 0.19620658, 0.18608237, 0.13995048, 0.08917453, 0.04789621, 0.02814563, 0.01613766, 0.0077591, 0.00429615, 0.00200551, 0.00086147, 0.00036904, 0.00019143, 0.00014956, 0.00009231, 0.00006813, 0.00002883, 0.00001577, 0.00000394, 0.00000158, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
 XYZ_RGB = [[3.24306333, -1.53837619, -0.49893282], [-0.96896309, 1.87542451, 0.04154303], [0.05568392, -0.20417438, 1.05799454]]
 
+class SpectralBasis:
+    # Precompiled matrices for one observer/illuminant pair:
+    #   spd     7 x SIZE rows (white, C, M, Y, R, G, B) for spectral upsampling
+    #   bands   the same basis transposed, one (C, M, Y, R, G, B) tuple per band
+    #   lum     SIZE luminance weights (CMF Y) for the concentration curve
+    #   rgb     3 x SIZE reflectance -> linear sRGB, i.e. XYZ_RGB x CMF fused
+    def __init__(self, spds, cmf_x, cmf_y, cmf_z, xyz_rgb):
+        self.spd = [[1.0] * SIZE] + [list(spd) for spd in spds]
+        self.bands = list(zip(*spds))
+        self.lum = list(cmf_y)
+        self.rgb = [
+            [row[0] * x + row[1] * y + row[2] * z for x, y, z in zip(cmf_x, cmf_y, cmf_z)]
+            for row in xyz_rgb
+        ]
+        self._arrays = None
+
+    def arrays(self):
+        # numpy views of (spd, lum, rgb), only built when the batch path runs
+        if self._arrays is None:
+            self._arrays = (np.array(self.spd), np.array(self.lum), np.array(self.rgb))
+        return self._arrays
+
+    def project(self, R):
+        r, g, b = self.rgb
+        return [dotproduct(R, r), dotproduct(R, g), dotproduct(R, b)]
+
+# numpy copies of the transfer tables for the batch path, built on first use
+_BATCH_TABLES = None
+
 def linear_to_concentration(l1, l2, t):
     t1 = l1 * (1 - t) ** 2
     t2 = l2 * t ** 2
 
     return t2 / (t1 + t2)
     
-def spectral_mix(color1, color2, t):
-    lrgb1 = srgb_to_linear(color1)
-    lrgb2 = srgb_to_linear(color2)
+def spectral_mix(color1, color2, t, basis=None):
+    basis = basis or BASIS
+
+    KS1, l1 = reflectance_terms(color1, basis)
+    KS2, l2 = reflectance_terms(color2, basis)
 
-    R1 = linear_to_reflectance(lrgb1)
-    R2 = linear_to_reflectance(lrgb2)
+    return mix_reflectance_terms(KS1, l1, KS2, l2, t, basis)
 
-    l1 = dotproduct(R1, CIE_CMF_Y)
-    l2 = dotproduct(R2, CIE_CMF_Y)
+def reflectance_terms(color, basis=None):
+    # Per-color half of spectral_mix: the K/S ratio of every band and the
+    # luminance used for the concentration curve. Depends only on the color,
+    # so callers mixing the same color repeatedly can keep the result.
+    basis = basis or BASIS
+    R = linear_to_reflectance(srgb_to_linear(color), basis)
 
+    return [(1 - r) ** 2 / (2 * r) for r in R], dotproduct(R, basis.lum)
+
+def mix_reflectance_terms(KS1, l1, KS2, l2, t, basis=None):
+    basis = basis or BASIS
     t = linear_to_concentration(l1, l2, t)
+    u = 1 - t
 
-    R = [0] * SIZE
+    # KM mixing and the sRGB projection fused into one pass, no band list
+    r = g = b = 0
+    wr, wg, wb = basis.rgb
 
-    for i in range(SIZE):
-        KS = (1 - t) * ((1 - R1[i]) ** 2 / (2 * R1[i])) + t * ((1 - R2[i]) ** 2 / (2 * R2[i]))
-        KM = 1 + KS - (KS ** 2 + 2 * KS) ** 0.5
+    for ks1, ks2, xr, xg, xb in zip(KS1, KS2, wr, wg, wb):
+        KS = u * ks1 + t * ks2
+        KM = 1 + KS - sqrt(KS ** 2 + 2 * KS)
 
-        R[i] = KM
-    
-    xyz = reflectance_to_xyz(R)
-    rgb = xyz_to_srgb(xyz)
+        r += KM * xr
+        g += KM * xg
+        b += KM * xb
 
-    return rgb
+    return [encode8(r), encode8(g), encode8(b)]
 
-def uncompand(x):
-    return x / 12.92 if x < 0.04045 else ((x + 0.055) / 1.055) ** GAMMA
+def spectral_mix_batch(colors1, colors2, t, basis=None):
+    # colors1/colors2 are (N, 3) 8-bit sRGB, t is a scalar or (N,) rates.
+    # Returns an (N, 3) int array matching spectral_mix row for row.
+    if np is None:
+        raise ImportError("spectral_mix_batch requires numpy")
+    basis = basis or BASIS
+    spd, lum, rgb = basis.arrays()
 
-def compand(x):
-    return x * 12.92 if x < 0.0031308 else 1.055 * x ** (1.0 / GAMMA) - 0.055
+    lrgb1 = _batch_srgb_to_linear(colors1)
+    lrgb2 = _batch_srgb_to_linear(colors2)
 
-def srgb_to_linear(srgb):
-    r = uncompand(srgb[0] / 255)
-    g = uncompand(srgb[1] / 255)
-    b = uncompand(srgb[2] / 255)
+    R1 = _batch_linear_to_reflectance(lrgb1, spd)
+    R2 = _batch_linear_to_reflectance(lrgb2, spd)
 
-    return [r, g, b]
+    l1 = R1 @ lum
+    l2 = R2 @ lum
 
-def linear_to_srgb(lrgb):
-    r = compand(lrgb[0])
-    g = compand(lrgb[1])
-    b = compand(lrgb[2])
+    t = np.broadcast_to(np.asarray(t, dtype=float), l1.shape)
+    t = linear_to_concentration(l1, l2, t)[:, None]
+
+    KS = (1 - t) * ((1 - R1) ** 2 / (2 * R1)) + t * ((1 - R2) ** 2 / (2 * R2))
+    R = 1 + KS - np.sqrt(KS ** 2 + 2 * KS)
+
+    return _batch_linear_to_srgb(R @ rgb.T)
+
+def _batch_tables():
+    global _BATCH_TABLES
+    if _BATCH_TABLES is None:
+        _BATCH_TABLES = (np.array(DECODE_TABLE), np.array(ENCODE8_THRESHOLDS))
+    return _BATCH_TABLES
+
+def _batch_srgb_to_linear(srgb):
+    decode_table = _batch_tables()[0]
+    return decode_table[np.asarray(srgb, dtype=np.intp).reshape(-1, 3)]
 
-    return [round(clamp(r, 0, 1) * 255), round(clamp(g, 0, 1) * 255), round(clamp(b, 0, 1) * 255)]
+def _batch_linear_to_srgb(lrgb):
+    thresholds = _batch_tables()[1]
+    return np.searchsorted(thresholds, lrgb, side="right")
+
+def _batch_linear_to_reflectance(lrgb, spd):
+    w = lrgb.min(axis=1)
+    lrgb = lrgb - w[:, None]
+    r, g, b = lrgb[:, 0], lrgb[:, 1], lrgb[:, 2]
+
+    weights = np.stack([
+        w,
+        np.minimum(g, b),
+        np.minimum(r, b),
+        np.minimum(r, g),
+        np.maximum(0, np.minimum(r - b, r - g)),
+        np.maximum(0, np.minimum(g - b, g - r)),
+        np.maximum(0, np.minimum(b - g, b - r)),
+    ], axis=1)
+
+    return np.maximum(EPSILON, weights @ spd)
+
+uncompand = decode
+compand = encode
+
+def srgb_to_linear(srgb):
+    return [decode8(srgb[0]), decode8(srgb[1]), decode8(srgb[2])]
+
+def linear_to_srgb(lrgb):
+    return [encode8(lrgb[0]), encode8(lrgb[1]), encode8(lrgb[2])]
     
 def reflectance_to_xyz(R):
     x = dotproduct(R, CIE_CMF_X)
@@ -114,28 +214,22 @@ def spectral_upsampling(lrgb):
 
     return [w, c, m, y, r, g, b]
 
-def linear_to_reflectance(lrgb):
-    weights = spectral_upsampling(lrgb)
-
-    R = [0] * SIZE
+def linear_to_reflectance(lrgb, basis=None):
+    w, c, m, y, r, g, b = spectral_upsampling(lrgb)
 
-    for i in range(SIZE):
-        R[i] = (
-            max(EPSILON,
-                weights[0]
-                + weights[1] * SPD_C[i]
-                + weights[2] * SPD_M[i]
-                + weights[3] * SPD_Y[i]
-                + weights[4] * SPD_R[i]
-                + weights[5] * SPD_G[i]
-                + weights[6] * SPD_B[i]
-            )
-        )
-
-    return R
+    return [
+        max(EPSILON, w + c * sc + m * sm + y * sy + r * sr + g * sg + b * sb)
+        for sc, sm, sy, sr, sg, sb in (basis or BASIS).bands
+    ]
 
 def dotproduct(a, b):
     return sum(x * y for x, y in zip(a, b))
 
 def clamp(value, min_value, max_value):
-    return min(max(value, min_value), max_value)
\ No newline at end of file
+    return min(max(value, min_value), max_value)
+
+BASIS = SpectralBasis(
+    (SPD_C, SPD_M, SPD_Y, SPD_R, SPD_G, SPD_B),
+    CIE_CMF_X, CIE_CMF_Y, CIE_CMF_Z,
+    XYZ_RGB,
+)
\ No newline at end of file
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import pyqtSignal, Qt, QPoint, QLine, QRect, QSize
+from PyQt5.QtGui import QPainter, QColor, QPen, QPixmap
+from PyQt5.QtWidgets import QWidget, QSizePolicy
+
+NEUTRAL_COLOR = QColor(200, 200, 200)
+TRANSPARENT_COLOR = QColor(0, 0, 0, 0)
+# gap between swatches, in pixels
+CELL_SPACING = 4
+# swatches never shrink below this; larger palettes scroll instead
+MIN_CELL_SIZE = 16
+# shapes draw their outline one pixel outside the cell rect
+SWATCH_MARGIN = 1
+
+
+class SwatchPixmapCache:
+    """
+    Bounded LRU of rendered swatches keyed on
+    (locked, width, height, RGB or None when empty, device pixel ratio).
+    """
+    def __init__(self, maxSize=512):
+        self._entries = OrderedDict()
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        pixmap = self._entries.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return pixmap
+
+    def put(self, key, pixmap):
+        self._entries[key] = pixmap
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class PaletteGridView(QWidget):
+    """
+    Paints every swatch of a PaletteModel in one widget.
+
+    Cells are laid out arithmetically, so hit-testing is a division and a
+    model change repaints only the rects of the cells it touched. Locked
+    cells are drawn as ellipses, mixable cells as rectangles and empty
+    cells get a cross.
+
+    Inside a QScrollArea only the exposed cells are painted, so palettes
+    with thousands of swatches cost the same to draw as the visible ones.
+    """
+
+    # cell index, mouse button, keyboard modifiers
+    clicked = pyqtSignal(int, int, int)
+    hovered = pyqtSignal(int)
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.hoverIndex = -1
+        self.cross_pen = QPen()
+        self.cross_pen.setBrush(NEUTRAL_COLOR)
+        self.setMouseTracking(True)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setMinimumSize(self._span(model.cols), self._span(model.rows))
+        self.swatchCache = SwatchPixmapCache()
+        model.observe(self.onModelChanged)
+
+    def _span(self, cells, size=MIN_CELL_SIZE):
+        return cells * size + (cells - 1) * CELL_SPACING
+
+    def sizeHint(self):
+        return QSize(self._span(self.model.cols, 30), self._span(self.model.rows, 30))
+
+    def _pitch(self):
+        # cell width and height plus spacing, as floats
+        cols = self.model.cols
+        rows = self.model.rows
+        cellW = (self.width() - (cols - 1) * CELL_SPACING) / cols
+        cellH = (self.height() - (rows - 1) * CELL_SPACING) / rows
+        return cellW + CELL_SPACING, cellH + CELL_SPACING
+
+    def cellRect(self, row, col):
+        pitchX, pitchY = self._pitch()
+        left = round(col * pitchX)
+        top = round(row * pitchY)
+        right = round(col * pitchX + pitchX - CELL_SPACING)
+        bottom = round(row * pitchY + pitchY - CELL_SPACING)
+        return QRect(left, top, max(right - left, 1), max(bottom - top, 1))
+
+    def indexAt(self, pos):
+        """
+        Cell index under a widget position, or -1 for gaps and outside.
+        """
+        pitchX, pitchY = self._pitch()
+        col = int(pos.x() // pitchX)
+        row = int(pos.y() // pitchY)
+        if not (0 <= row < self.model.rows and 0 <= col < self.model.cols):
+            return -1
+        if not self.cellRect(row, col).contains(pos):
+            return -1
+        return self.model.index(row, col)
+
+    def onModelChanged(self, indices):
+        if len(indices) * 2 > self.model.size:
+            self.update()
+            return
+        for i in indices:
+            rect = self.cellRect(*self.model.position(i))
+            # the outline reaches one pixel outside the cell
+            self.update(rect.adjusted(-1, -1, 1, 1))
+
+    def resizeEvent(self, e):
+        # every cached swatch has the old cell size now
+        self.swatchCache.clear()
+        super().resizeEvent(e)
+
+    def swatchPixmap(self, locked, width, height, rgb, dpr):
+        key = (locked, width, height, rgb, dpr)
+        pixmap = self.swatchCache.get(key)
+        if pixmap is None:
+            pixmap = self.renderSwatch(locked, width, height, rgb, dpr)
+            self.swatchCache.put(key, pixmap)
+        return pixmap
+
+    def renderSwatch(self, locked, width, height, rgb, dpr):
+        margin = SWATCH_MARGIN * 2
+        pixmap = QPixmap(round((width + margin) * dpr), round((height + margin) * dpr))
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(Qt.transparent)
+        qp = QPainter(pixmap)
+        qp.translate(SWATCH_MARGIN, SWATCH_MARGIN)
+        rect = QRect(0, 0, width, height)
+        qp.setPen(QPen(Qt.black))
+        qp.setBrush(QColor(*rgb) if rgb is not None else TRANSPARENT_COLOR)
+        if locked:
+            self.drawEllipse(qp, rect)
+        else:
+            self.drawRectangle(qp, rect)
+        if rgb is None:
+            self.drawCross(qp, rect)
+        qp.end()
+        return pixmap
+
+    def paintEvent(self, e):
+        model = self.model
+        pitchX, pitchY = self._pitch()
+        area = e.rect()
+        # only visit the cells that intersect the exposed area
+        firstRow = max(int(area.top() // pitchY), 0)
+        lastRow = min(int(area.bottom() // pitchY), model.rows - 1)
+        firstCol = max(int(area.left() // pitchX), 0)
+        lastCol = min(int(area.right() // pitchX), model.cols - 1)
+        dpr = self.devicePixelRatioF()
+        qp = QPainter(self)
+        for row in range(firstRow, lastRow + 1):
+            for col in range(firstCol, lastCol + 1):
+                i = model.index(row, col)
+                rect = self.cellRect(row, col)
+                pixmap = self.swatchPixmap(
+                    model.isLocked(i), rect.width(), rect.height(), model.getRGB(i), dpr
+                )
+                qp.drawPixmap(rect.x() - SWATCH_MARGIN, rect.y() - SWATCH_MARGIN, pixmap)
+        qp.end()
+
+    def drawRectangle(self, qp, rect):
+        qp.drawRect(rect.x() - 1, rect.y() - 1, rect.width() + 1, rect.height() + 1)
+
+    def drawEllipse(self, qp, rect):
+        qp.drawEllipse(
+            rect.center(),
+            (rect.width() + 1) // 2.2,
+            (rect.height() + 1) // 2.2,
+        )
+
+    def drawCross(self, qp, rect):
+        w = rect.width()
+        h = rect.height()
+        center = rect.topLeft() + QPoint(w // 2, h // 2)
+        line_half_length = min(w, h) // 6
+        right_ascending_diag = QPoint(line_half_length, line_half_length)
+        left_ascending_diag = QPoint(-line_half_length, line_half_length)
+        self.cross_pen.setWidth(line_half_length // 2)
+        qp.setPen(self.cross_pen)
+        qp.drawLine(QLine(center + right_ascending_diag, center - right_ascending_diag))
+        qp.drawLine(QLine(center + left_ascending_diag, center - left_ascending_diag))
+
+    def mouseMoveEvent(self, e):
+        index = self.indexAt(e.pos())
+        if index != self.hoverIndex:
+            self.hoverIndex = index
+            if index >= 0:
+                self.hovered.emit(index)
+
+    def leaveEvent(self, e):
+        self.hoverIndex = -1
+
+    def mousePressEvent(self, e):
+        index = self.indexAt(e.pos())
+        if index >= 0:
+            self.clicked.emit(index, int(e.button()), int(e.modifiers()))
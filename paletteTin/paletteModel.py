@@ -0,0 +1,258 @@
+from struct import Struct
+
+from .modules.engine.derivedColor import DerivedColor
+
+# per-cell flag bits
+EMPTY = 1
+LOCKED = 2
+
+# packed palette: magic, format version, rows, cols, then rows * cols * 3
+# RGB bytes and one flag byte per cell
+PACKED_MAGIC = b"PTIN"
+PACKED_VERSION = 1
+PACKED_HEADER = Struct("<4sBHH")
+
+
+# cells compared per block before falling back to a per-cell scan
+DIFF_BLOCK = 64
+
+
+def changedCells(rgb, flags, newRgb, newFlags):
+    """
+    Indices of the cells whose RGB bytes or flag differ. Whole blocks are
+    compared first, so the per-cell scan only runs where something changed
+    and large palettes cost little more than a memcmp.
+    """
+    changed = []
+    count = len(flags)
+    for start in range(0, count, DIFF_BLOCK):
+        end = min(start + DIFF_BLOCK, count)
+        if (
+            flags[start:end] == newFlags[start:end]
+            and rgb[start * 3:end * 3] == newRgb[start * 3:end * 3]
+        ):
+            continue
+        for i in range(start, end):
+            o = i * 3
+            if flags[i] != newFlags[i] or rgb[o:o + 3] != newRgb[o:o + 3]:
+                changed.append(i)
+    return changed
+
+
+def isPacked(data):
+    """
+    True for packed palette bytes, False for anything else (such as the
+    nested lists of a legacy JSON palette).
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        return False
+    return bytes(data[: len(PACKED_MAGIC)]) == PACKED_MAGIC
+
+
+class PaletteModel:
+    """
+    Palette state for a rows x cols grid, independent of any widget.
+
+    Colors live in one contiguous bytearray (3 bytes per cell, row major)
+    and each cell has a flag byte (EMPTY, LOCKED). Every change bumps
+    `generation` and is reported to observers with the affected cell
+    indices, so views only refresh what changed. Changed cells also
+    collect in `dirty` until a writer takes them with takeDirty().
+    """
+
+    def __init__(self, rows, cols, lockedColumns=()):
+        self.rows = rows
+        self.cols = cols
+        self.rgb = bytearray(rows * cols * 3)
+        self.flags = bytearray([EMPTY]) * (rows * cols)
+        self.generation = 0
+        self._observers = []
+        self.dirty = set()
+        # DerivedColor per cell, built on demand and dropped on change
+        self._derived = [None] * (rows * cols)
+        for row in range(rows):
+            for col in lockedColumns:
+                self.flags[self.index(row, col)] |= LOCKED
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    def index(self, row, col):
+        return row * self.cols + col
+
+    def position(self, index):
+        return divmod(index, self.cols)
+
+    def observe(self, callback):
+        """
+        Register callback(indices), called after every change.
+        """
+        self._observers.append(callback)
+
+    def _changed(self, indices):
+        if not indices:
+            return
+        self.generation += 1
+        for i in indices:
+            self._derived[i] = None
+        self.dirty.update(indices)
+        for callback in self._observers:
+            callback(indices)
+
+    def takeDirty(self):
+        """
+        Return the cells changed since the last call and reset the set.
+        """
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def isEmpty(self, index):
+        return bool(self.flags[index] & EMPTY)
+
+    def isLocked(self, index):
+        return bool(self.flags[index] & LOCKED)
+
+    def getRGB(self, index):
+        if self.flags[index] & EMPTY:
+            return None
+        o = index * 3
+        return tuple(self.rgb[o:o + 3])
+
+    def derivedColor(self, index):
+        if self.flags[index] & EMPTY:
+            return None
+        derived = self._derived[index]
+        if derived is None:
+            derived = self._derived[index] = DerivedColor(self.getRGB(index))
+        return derived
+
+    def setRGB(self, index, rgb):
+        o = index * 3
+        self.rgb[o:o + 3] = bytes((rgb[0], rgb[1], rgb[2]))
+        self.flags[index] &= ~EMPTY
+        self._changed([index])
+
+    def clear(self, index):
+        self.flags[index] |= EMPTY
+        self._changed([index])
+
+    def setLocked(self, index, locked):
+        if locked:
+            self.flags[index] |= LOCKED
+        else:
+            self.flags[index] &= ~LOCKED
+        self._changed([index])
+
+    def toggleLocked(self, index):
+        self.setLocked(index, not self.isLocked(index))
+
+    def snapshot(self):
+        """
+        Whole palette as one bytes object: RGB buffer then flags.
+        """
+        return bytes(self.rgb) + bytes(self.flags)
+
+    def restore(self, snapshot):
+        split = self.size * 3
+        self._replace(snapshot[:split], snapshot[split:])
+
+    def saveState(self):
+        """
+        Colors, flags and the built DerivedColors, for loadState() later.
+        """
+        return (self.snapshot(), list(self._derived))
+
+    def loadState(self, state):
+        snapshot, derived = state
+        self.restore(snapshot)
+        # the saved DerivedColors match the restored colors exactly
+        self._derived = list(derived)
+
+    def _replace(self, rgb, flags):
+        """
+        Swap in whole new buffers, reporting only the cells that differ so a
+        bulk load costs one observer call and no work for unchanged cells.
+        """
+        if rgb == self.rgb and flags == self.flags:
+            return
+        changed = changedCells(self.rgb, self.flags, rgb, flags)
+        self.rgb[:] = rgb
+        self.flags[:] = flags
+        self._changed(changed)
+
+    def toNested(self):
+        """
+        rows x cols nested lists of [r, g, b] or None, the JSON palette layout.
+        """
+        palette = []
+        for row in range(self.rows):
+            colors = []
+            for col in range(self.cols):
+                rgb = self.getRGB(self.index(row, col))
+                colors.append(list(rgb) if rgb is not None else None)
+            palette.append(colors)
+        return palette
+
+    def loadNested(self, palette):
+        """
+        Load colors from nested lists; lock state is kept. Cells outside
+        the given palette are left untouched.
+        """
+        rgbs = bytearray(self.rgb)
+        flags = bytearray(self.flags)
+        for row, colors in enumerate(palette[:self.rows]):
+            for col, rgb in enumerate(colors[:self.cols]):
+                i = self.index(row, col)
+                if rgb is None:
+                    flags[i] |= EMPTY
+                else:
+                    o = i * 3
+                    rgbs[o:o + 3] = bytes((rgb[0], rgb[1], rgb[2]))
+                    flags[i] &= ~EMPTY
+        self._replace(rgbs, flags)
+
+    def toBytes(self):
+        """
+        Palette in the packed binary layout, colors and lock state included.
+        """
+        header = PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, self.rows, self.cols)
+        return header + bytes(self.rgb) + bytes(self.flags)
+
+    def loadBytes(self, data):
+        """
+        Load a palette written by toBytes(). Buffers are sliced straight out
+        of a memoryview; a palette of a different size fills the overlapping
+        top left cells and leaves the rest untouched.
+        """
+        view = memoryview(data)
+        if len(view) < PACKED_HEADER.size:
+            raise ValueError("Packed palette is truncated")
+        magic, version, rows, cols = PACKED_HEADER.unpack_from(view)
+        if magic != PACKED_MAGIC:
+            raise ValueError("Not a packed palette")
+        if version != PACKED_VERSION:
+            raise ValueError(f"Unsupported packed palette version: {version}")
+        count = rows * cols
+        rgbStart = PACKED_HEADER.size
+        flagStart = rgbStart + count * 3
+        if len(view) < flagStart + count:
+            raise ValueError("Packed palette is truncated")
+        rgb = view[rgbStart:flagStart]
+        flags = view[flagStart:flagStart + count]
+        if rows != self.rows or cols != self.cols:
+            rgb, flags = self._fitted(rows, cols, rgb, flags)
+        self._replace(rgb, flags)
+
+    def _fitted(self, rows, cols, rgb, flags):
+        # overlay a rows x cols palette on a copy of the current buffers
+        rgbs = bytearray(self.rgb)
+        cellFlags = bytearray(self.flags)
+        width = min(cols, self.cols)
+        for row in range(min(rows, self.rows)):
+            src = row * cols
+            dst = self.index(row, 0)
+            rgbs[dst * 3:(dst + width) * 3] = rgb[src * 3:(src + width) * 3]
+            cellFlags[dst:dst + width] = flags[src:src + width]
+        return rgbs, cellFlags
@@ -15,20 +15,47 @@ from PyQt5.QtWidgets import (
     QSizeGrip,
     QSpacerItem,
     QSizePolicy,
+    QScrollArea,
+    QFrame,
 )
-from PyQt5.QtGui import QIcon
-
-from .colorTray import *
-from .colorMixing import mixingList
+from PyQt5.QtGui import QIcon, QColor
+
+from .paletteModel import PaletteModel, isPacked
+from .paletteGridView import PaletteGridView
+from .colorMixing import mixingList, mixBatch, mixCurve, quickMix
+from .mixWorker import MixExecutor
+from .colorContext import ColorContext
+from .documentStateCache import (
+    DEFAULT_CACHE_BUDGET,
+    DocumentState,
+    DocumentStateCache,
+    documentId,
+)
+from .mixCurveStrip import MixCurveStrip
 from .annotationService import *
 from .modules.palette.paletteHistoryService import *
 from .constants import PALETTE_HSV_16
 from .modules.palette.paletteService import *
+from .modules.palette.paletteStore import PaletteStore
 from functools import partial
 
 DOCKER_NAME = "PaletteTin"
 DOCKER_ID = "pykrita_PaletteTin"
 PALETTE_HSV = PALETTE_HSV_16
+# Krita has no foreground-changed or color-space-changed signal, so the
+# docker polls for both
+CANVAS_POLL_MS = 150
+MAX_GRID_SIZE = 1024
+# Krita actions that save or close a document; pending annotation writes
+# are flushed before they run
+SAVE_ACTIONS = (
+    "file_save",
+    "file_save_as",
+    "file_close",
+    "file_close_all",
+    "save_incremental_version",
+    "save_incremental_backup",
+)
 
 
 class PaletteTin(DockWidget):
@@ -38,28 +65,97 @@ class PaletteTin(DockWidget):
 
         self.canvasColor = QColor(200, 200, 200)
         self._kraActiveDocument = None
+        self._documentId = None
+        # view, canvas and color space of the active document
+        self.colorContext = None
         self.annotationService = AnnotationService()
-        self.history = PaletteHistoryService(1000)
-        self.ps = PaletteService()
+        self.settings = readSettings()
+        self.history = self.newHistory()
+        # palettes and histories of the other open documents
+        self.documentStates = DocumentStateCache(
+            self.settings.get("documentCacheKb", DEFAULT_CACHE_BUDGET // 1024) * 1024
+        )
+        self.ps = PaletteService(self.openPaletteStore())
+        # mixes that miss the cache run here, off the GUI thread
+        self.mixExecutor = MixExecutor(self)
+        # cell index -> mixes clicked while that cell's mix was running
+        self.queuedMixes = {}
 
-        self.colorCount = 6
-        self.gridCount = 8
+        self.colorCount, self.gridCount = self.gridSize()
 
         self.mixRate = 50
         self.mixModes = mixingList
         self.hybridRate = 40
 
-        self.colorGrid = []
         self.hsvDialog = None
         self.saveDialog = None
         self.loadDialog = None
         self.helpDialog = None
         self.erase_mode = False
         self.undoStack = []
+        # cell the mix curve strip previews against the foreground color
+        self.previewIndex = None
+        self._mixCurveKey = None
 
         self.setUi()
         self.connectButtons()
         self.connectColorGrid()
+        # no document yet, nothing to mix against
+        self.gridView.setEnabled(False)
+
+        self.canvasPollTimer = QTimer(self)
+        self.canvasPollTimer.timeout.connect(self.pollCanvas)
+        self.canvasPollTimer.start(CANVAS_POLL_MS)
+
+        # Krita has no pre-save signal; flush pending annotation writes
+        # whenever a view or the application goes away
+        notifier = Krita.instance().notifier()
+        notifier.setActive(True)
+        notifier.viewClosed.connect(self.annotationWriter.flush)
+        notifier.applicationClosing.connect(self.annotationWriter.flush)
+        notifier.imageClosed.connect(self.pruneDocumentStates)
+
+        # viewClosed fires after Krita's save prompt, so it is too late for
+        # a save. Shortcuts reach their action as a Shortcut event before
+        # it triggers; menus and toolbars are only reached by leaving the
+        # docker first (see leaveEvent).
+        self.saveActions = []
+        for name in SAVE_ACTIONS:
+            action = Krita.instance().action(name)
+            if action is not None:
+                action.installEventFilter(self)
+                self.saveActions.append(action)
+
+    def openPaletteStore(self):
+        """
+        The SQLite palette store if settings.json enables it, seeded from
+        the JSON palettes the first time; None keeps the JSON library.
+        """
+        if not self.settings.get("usePaletteStore", False):
+            return None
+        store = PaletteStore()
+        if not store.names():
+            store.importDirectory()
+        return store
+
+    def newHistory(self):
+        return PaletteHistoryService(
+            self.settings.get("historyBudgetKb", DEFAULT_BUDGET // 1024) * 1024
+        )
+
+    def gridSize(self):
+        """
+        Palette (columns, rows) from settings.json, defaulting to 6 x 8.
+        The packed annotation stores each as 16 bits.
+        """
+        cols = self.settings.get("gridColumns", 6)
+        rows = self.settings.get("gridRows", 8)
+        try:
+            cols = min(max(int(cols), 2), MAX_GRID_SIZE)
+            rows = min(max(int(rows), 1), MAX_GRID_SIZE)
+        except (TypeError, ValueError):
+            return 6, 8
+        return cols, rows
 
     def setUi(self):
         self.rootWidget = QWidget()
@@ -114,6 +210,10 @@ class PaletteTin(DockWidget):
         self.mixModeDropdown.addItems(self.mixModes.keys())
         self.mixModeDropdown.setCurrentIndex(2)
         self.mixModeDropdown.setMaximumHeight(60)
+        self.mixModeDropdown.currentIndexChanged.connect(self.refreshMixCurve)
+
+        self.mixCurveStrip = MixCurveStrip()
+        self.mixCurveStrip.setRate(starting_mix_rate)
 
         self.mixRateBox = QWidget()
         self.mixRateBoxContainer = QHBoxLayout()
@@ -124,15 +224,25 @@ class PaletteTin(DockWidget):
 
         self.mixerContainer.addWidget(self.mixModeDropdown, 0, Qt.AlignHCenter)
         self.mixerContainer.addWidget(self.mixRateBox, 0)
+        self.mixerContainer.addWidget(self.mixCurveStrip, 0)
 
-        # COLOR GRID
-        for r in range(self.gridCount):
-            self.colorGrid.append([])
-            for c in range(self.colorCount):
-                # Set mixable=False for the first and last columns
-                mixable = not (c == 0 or c == self.colorCount - 1)
-                self.colorGrid[r].append(ColorTray(mixable=mixable))
-                self.paletteContainer.addWidget(self.colorGrid[r][c], r, c, 1, 1)
+        # COLOR GRID, the first and last columns start locked
+        self.model = PaletteModel(
+            self.gridCount, self.colorCount, (0, self.colorCount - 1)
+        )
+        self.annotationWriter = AnnotationWriter(
+            self.annotationService,
+            self.model,
+            self.settings.get("annotationWriteDelay", DEFAULT_WRITE_DELAY),
+            self,
+        )
+        self.gridView = PaletteGridView(self.model)
+        # the grid keeps a minimum swatch size and scrolls once it no longer fits
+        self.gridScroll = QScrollArea()
+        self.gridScroll.setWidget(self.gridView)
+        self.gridScroll.setWidgetResizable(True)
+        self.gridScroll.setFrameShape(QFrame.NoFrame)
+        self.paletteContainer.addWidget(self.gridScroll, 0, 0, 1, 1)
 
         # toolbox holds action buttons
         toolbuttonSizePolicy = QSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed)
@@ -141,10 +251,19 @@ class PaletteTin(DockWidget):
         self.buttonErase.setIcon(Krita.instance().icon("draw-eraser"))
         self.buttonErase.setSizePolicy(toolbuttonSizePolicy)
 
+        self.buttonFill = QToolButton()
+        self.buttonFill.setIcon(Krita.instance().icon("krita_tool_gradient"))
+        self.buttonFill.setToolTip("Fill every row with a ramp between its end swatches")
+        self.buttonFill.setSizePolicy(toolbuttonSizePolicy)
+
         self.buttonUndo = QToolButton()
         self.buttonUndo.setIcon(Krita.instance().icon("edit-undo"))
         self.buttonUndo.setSizePolicy(toolbuttonSizePolicy)
 
+        self.buttonRedo = QToolButton()
+        self.buttonRedo.setIcon(Krita.instance().icon("edit-redo"))
+        self.buttonRedo.setSizePolicy(toolbuttonSizePolicy)
+
         self.buttonHelp = QToolButton()
         self.buttonHelp.setIcon(Krita.instance().icon("system-help"))
         self.buttonHelp.setSizePolicy(toolbuttonSizePolicy)
@@ -166,7 +285,9 @@ class PaletteTin(DockWidget):
         self.toolboxContainer.setContentsMargins(0, 0, 0, 0)
 
         self.toolboxContainer.addWidget(self.buttonErase)
+        self.toolboxContainer.addWidget(self.buttonFill)
         self.toolboxContainer.addWidget(self.buttonUndo)
+        self.toolboxContainer.addWidget(self.buttonRedo)
         self.toolboxContainer.addWidget(self.buttonSave)
         self.toolboxContainer.addWidget(self.buttonLoad)
         self.toolboxContainer.addWidget(self.buttonHelp)
@@ -192,63 +313,85 @@ class PaletteTin(DockWidget):
 
     def loadPaletteByName(self, name):
         try:
-            self.swatchRGB = self.ps.getPaletteAsJSON(name)["palette"]
-            self.history.appendPalette(self.swatchRGB)
+            self.applyPalette(self.ps.getPaletteAsJSON(name)["palette"])
         except Exception:
             print("Error executing loading palette does not exists or empty")
 
+    def applyPalette(self, palette):
+        # load nested rows into the grid as one undoable edit
+        self.swatchRGB = palette
+        self.history.appendPalette(self.model.snapshot())
+        self.annotationWriter.schedule()
+
     def canvasChanged(self, canvas):
         """
         important, since it uses resources from the document itself
         this handles when and how it loads a data, explain better
         """
-        if canvas:
-            if Krita.instance().activeDocument() and canvas.view():
-                self.connectColorGrid()
-                self._kraActiveDocument = canvas.view().document()
-                self.history.reset()
-            else:
-                self.disconnectColorGrid()
+        # pending edits belong to the document being left
+        self.annotationWriter.flush()
+        self.pruneDocumentStates()
+        view = canvas.view() if canvas else None
+        if view is None or not Krita.instance().activeDocument():
+            self.gridView.setEnabled(False)
+            self.colorContext = None
+            return
+        self.gridView.setEnabled(True)
+        self.colorContext = ColorContext(view)
+        document = view.document()
+        docId = documentId(document)
+        if docId == self._documentId:
+            return
+
+        # results of mixes started in the previous document are dropped
+        self.mixExecutor.cancelAll()
+        self.queuedMixes.clear()
+        if self._documentId is not None:
+            self.documentStates.put(
+                self._documentId, DocumentState(self.model.saveState(), self.history)
+            )
+        self._documentId = docId
+        self._kraActiveDocument = document
+        self.annotationService.document = document
+        state = self.documentStates.take(docId)
+        if state is not None:
+            self.history = state.history
+            self.model.loadState(state.palette)
+            # the document's annotation already holds this palette
+            self.annotationWriter.discard()
         else:
-            self.disconnectColorGrid()
-        self.annotationService.document = self._kraActiveDocument
-        self.annotationService.startup()
-        self.loadAnnotationColors()
+            self.history = self.newHistory()
+            self.annotationService.startup()
+            self.loadAnnotationColors()
+
+    def pruneDocumentStates(self, *args):
+        openIds = {documentId(doc) for doc in Krita.instance().documents()}
+        self.documentStates.prune(openIds)
+        if self._documentId not in openIds:
+            # a reopened document must be read from its annotation again
+            self._documentId = None
 
     def connectButtons(self):
         self.buttonErase.clicked.connect(self.toggleEraseMode)
+        self.buttonFill.clicked.connect(lambda: self.fillRows())
         self.buttonUndo.clicked.connect(self.undo)
+        self.buttonRedo.clicked.connect(self.redo)
         self.buttonSave.clicked.connect(self.openSaveDialog)
         self.buttonLoad.clicked.connect(self.openLoadDialog)
         self.buttonHelp.clicked.connect(self.openHelpDialog)
 
     def connectColorGrid(self):
-        for row in self.colorGrid:
-            for color in row:
-                # Disconnect existing connections to avoid multiple connections
-                try:
-                    color.clicked.disconnect()
-                except TypeError:
-                    pass
-                color.clicked.connect(partial(self.colorTrayClickEvent, color))
-
-    def disconnectColorGrid(self):
-        for row in self.colorGrid:
-            for color in row:
-                color.disconnect()
+        self.gridView.clicked.connect(self.cellClickEvent)
+        self.gridView.hovered.connect(self.setPreviewCell)
 
     def avoidLockingMinSize(self):
         self.rootWidget.setMinimumSize(30, 30)
 
-    def setFgColor(self, colorTray):
-        rgb = colorTray.getColorRGB()
-        if rgb is None:
+    def setFgColor(self, index):
+        rgb = self.model.getRGB(index)
+        if rgb is None or self.colorContext is None:
             return
-        colorToSet = colorTray.getColorForSet(
-            Krita.instance().activeDocument(),
-            Krita.instance().activeWindow().activeView().canvas(),
-        )
-        Krita.instance().activeWindow().activeView().setForeGroundColor(colorToSet)
+        self.colorContext.setForeground(rgb)
 
     def toggleEraseMode(self):
         if self.erase_mode:
@@ -260,62 +403,200 @@ class PaletteTin(DockWidget):
             self.buttonErase.setStyleSheet("QToolButton{background-color : red;}")
             self.rootWidget.setCursor(Qt.CrossCursor)
 
-    def colorTrayClickEvent(self, colorTray, button, modifiers):
+    def cellClickEvent(self, index, button, modifiers):
+        model = self.model
+        mixable = not model.isLocked(index)
         if self.erase_mode:
             if button == Qt.MiddleButton:
                 self.toggleEraseMode()
-            elif colorTray.mixable:
-                colorTray.deleteColor()
+            elif mixable:
+                model.clear(index)
+                self.printColorGrid()
             return
 
         if button == Qt.LeftButton:
-            if colorTray.color is None:
-                self.colorMix(colorTray)
+            if model.isEmpty(index):
+                self.colorMix(index)
             else:
-                self.setFgColor(colorTray)
-        elif button == Qt.RightButton and colorTray.mixable:
+                self.setFgColor(index)
+        elif button == Qt.RightButton and modifiers == Qt.ControlModifier:
+            self.fillRows([model.position(index)[0]])
+        elif button == Qt.RightButton and mixable:
             if modifiers == Qt.ShiftModifier:
-                colorTray.deleteColor()
+                model.clear(index)
+                self.printColorGrid()
             else:
-                self.colorMix(colorTray)
+                self.colorMix(index)
         elif button == Qt.MiddleButton:
-            if colorTray.color is not None:
-                colorTray.toggleMixability()
+            if not model.isEmpty(index):
+                model.toggleLocked(index)
+                self.printColorGrid()
 
     def updateMixRate(self, value):
         self.updateMixRateLabel(value)
         self.mixRate = value
+        self.mixCurveStrip.setRate(value)
+
+    def setPreviewCell(self, index):
+        self.previewIndex = index
+        self.refreshMixCurve()
+
+    def foregroundRGB(self):
+        if self.colorContext is None:
+            return None
+        return self.colorContext.foregroundRGB()
+
+    def pollCanvas(self):
+        if not self.isVisible() or self.colorContext is None:
+            return
+        self.colorContext.revalidate()
+        self.refreshMixCurve()
+
+    def refreshMixCurve(self):
+        """
+        Recompute the mix curve strip, but only when the previewed swatch,
+        the foreground or the mix mode actually changed.
+        """
+        if not self.isVisible():
+            return
+        mode = self.mixModeDropdown.currentText()
+        base = (
+            self.model.derivedColor(self.previewIndex)
+            if self.previewIndex is not None
+            else None
+        )
+        fg = self.foregroundRGB() if base is not None else None
+        key = (mode, tuple(base), fg) if fg is not None else None
+        if key == self._mixCurveKey:
+            return
+        self._mixCurveKey = key
+        if key is None:
+            self.mixExecutor.cancel("curve")
+            self.mixCurveStrip.setCurve(None)
+            return
+        self.mixExecutor.submit(
+            "curve", partial(mixCurve, mode, base, list(fg)), self.mixCurveStrip.setCurve
+        )
 
     def updateMixRateLabel(self, value):
         self.mixRateLabel.setText(f"Mix {value}%")
 
-    def colorMix(self, colorTray):
-        mr = self.mixRate
-        view = Krita.instance().activeWindow().activeView()
-        cfg = view.foregroundColor().colorForCanvas(view.canvas())
-        mixinMode = self.mixModes[self.mixModeDropdown.currentText()]
-
-        boxRGB = colorTray.getColorRGB()
-        secondaryRGB = [cfg.red(), cfg.green(), cfg.blue()]
-        red, green, blue = 0, 1, 2
-        if boxRGB is None:
-            mixed = secondaryRGB
-            colorTray.setColorRGB(mixed[red], mixed[green], mixed[blue])
-        else:
-            primaryRGB = [boxRGB["red"], boxRGB["green"], boxRGB["blue"]]
-            mixed = mixinMode(primaryRGB, secondaryRGB, mr / 100)
-            colorTray.setColorRGB(mixed[red], mixed[green], mixed[blue])
-        self.setFgColor(colorTray)
+    def colorMix(self, index):
+        """
+        Mix the foreground into a cell. Cached and cheap mixes apply at once;
+        the rest run on the mix executor and apply when they finish, unless
+        the cell changed in the meantime. Clicks on a cell whose mix is
+        still running are queued and each mixes into the previous result.
+        """
+        fg = self.foregroundRGB()
+        if fg is None:
+            return
+        mix = (self.mixModeDropdown.currentText(), list(fg), self.mixRate / 100)
+        if index in self.queuedMixes:
+            self.queuedMixes[index].append(mix)
+            return
+        self.startMix(index, *mix)
+
+    def startMix(self, index, mode, secondaryRGB, rate):
+        primaryRGB = self.model.derivedColor(index)
+        if primaryRGB is None:
+            self.applyMix(index, None, secondaryRGB)
+            return
+        mixed = quickMix(mode, primaryRGB, secondaryRGB, rate)
+        if mixed is not None:
+            self.applyMix(index, primaryRGB, mixed)
+            return
+        self.queuedMixes[index] = []
+        self.mixExecutor.submit(
+            ("cell", index),
+            partial(self.mixModes[mode], primaryRGB, secondaryRGB, rate),
+            partial(self.finishMix, index, primaryRGB),
+            lambda message: self.queuedMixes.pop(index, None),
+        )
+
+    def finishMix(self, index, primaryRGB, mixed):
+        self.applyMix(index, primaryRGB, mixed)
+        queued = self.queuedMixes.pop(index, [])
+        while queued:
+            self.startMix(index, *queued.pop(0))
+            if index in self.queuedMixes:
+                # the next mix is running; the rest wait behind it
+                self.queuedMixes[index].extend(queued)
+                break
+
+    def applyMix(self, index, primaryRGB, mixed):
+        if self.model.derivedColor(index) != primaryRGB:
+            # the cell changed while the mix was running
+            return
+        self.model.setRGB(index, mixed)
+        self.setFgColor(index)
         self.printColorGrid()
+        self.previewIndex = index
+        self.refreshMixCurve()
+
+    def fillRows(self, rows=None):
+        """
+        Fill the mixable cells of each row with a ramp from its first to its
+        last swatch using the current mix mode, in one batched mix and one
+        history entry. Rows missing either end swatch are left alone. The
+        batch runs on the mix executor; a newer fill of the same rows
+        supersedes it.
+        """
+        mode = self.mixModeDropdown.currentText()
+        model = self.model
+        last = self.colorCount - 1
+        targets, before, starts, ends, rates = [], [], [], [], []
+        for r in range(self.gridCount) if rows is None else rows:
+            start = model.derivedColor(model.index(r, 0))
+            end = model.derivedColor(model.index(r, last))
+            if start is None or end is None:
+                continue
+            for c in range(1, last):
+                i = model.index(r, c)
+                if not model.isLocked(i):
+                    targets.append(i)
+                    before.append(model.derivedColor(i))
+                    starts.append(start)
+                    ends.append(end)
+                    rates.append(c / last)
+        if not targets:
+            return
+        self.mixExecutor.submit(
+            ("fill", None if rows is None else tuple(rows)),
+            partial(mixBatch, mode, starts, ends, rates),
+            partial(self.applyFill, targets, before, starts, ends),
+        )
+
+    def applyFill(self, targets, before, starts, ends, results):
+        model = self.model
+        last = self.colorCount - 1
+        changed = False
+        for i, old, start, end, mixed in zip(targets, before, starts, ends, results):
+            row = model.position(i)[0]
+            # skip cells that were edited or locked, or whose row ends
+            # changed, while the batch was running
+            if model.isLocked(i) or model.derivedColor(i) != old:
+                continue
+            if model.derivedColor(model.index(row, 0)) != start:
+                continue
+            if model.derivedColor(model.index(row, last)) != end:
+                continue
+            model.setRGB(i, mixed)
+            changed = True
+        if changed:
+            self.printColorGrid()
 
     def loadAnnotationColors(self):
-        if self.annotationService.palette and self.colorGrid:
-            for row in range(len(self.colorGrid)):
-                for col in range(len(self.colorGrid[row])):
-                    self.colorGrid[row][col].importRGB(
-                        self.annotationService.palette[row][col]
-                    )
-            self.history.appendPalette(self.annotationService.palette)
+        palette = self.annotationService.palette
+        if palette:
+            if isPacked(palette):
+                self.model.loadBytes(palette)
+            else:
+                self.model.loadNested(palette)
+            # the document already holds this palette
+            self.annotationWriter.discard()
+        # base state for undo in this document
+        self.history.appendPalette(self.model.snapshot())
 
     def openSaveDialog(self):
         if self.saveDialog is None:
@@ -356,41 +637,46 @@ class PaletteTin(DockWidget):
 
     def undo(self):
         prev = self.history.returnPreviousPalette()
-        if self.colorGrid and prev:
-            for row in range(len(self.colorGrid)):
-                for col in range(len(self.colorGrid[row])):
-                    self.colorGrid[row][col].importRGB(prev[row][col])
+        if prev:
+            self.model.restore(prev)
+            self.annotationWriter.schedule()
+
+    def redo(self):
+        following = self.history.returnNextPalette()
+        if following:
+            self.model.restore(following)
+            self.annotationWriter.schedule()
 
     def printHSV(self):
         if self.hsvDialog:
             self.hsvDialog.printHSV()
 
     def printColorGrid(self):
-        save = []
-        for row in range(len(self.colorGrid)):
-            dd = []
-            for col in range(len(self.colorGrid[row])):
-                dd.append(self.colorGrid[row][col].exportRGB())
-            save.append(dd)
-        self.history.appendPalette(save)
-        self.annotationService.savePalette(save)
+        # the annotation itself is written by annotationWriter once edits settle
+        self.history.appendPalette(self.model.snapshot())
+        self.annotationWriter.schedule()
+
+    def closeEvent(self, e):
+        self.annotationWriter.flush()
+        super().closeEvent(e)
+
+    def leaveEvent(self, e):
+        self.annotationWriter.flush()
+        super().leaveEvent(e)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Shortcut and obj in self.saveActions:
+            self.annotationWriter.flush()
+        return super().eventFilter(obj, event)
 
     @property
     def swatchRGB(self):
-        # Getter method for swatchRGB
-        save = []
-        for row in range(len(self.colorGrid)):
-            dd = [cell.exportRGB() for cell in self.colorGrid[row]]
-            save.append(dd)
-        return save
+        # Palette as nested [r, g, b] / None lists, the JSON layout
+        return self.model.toNested()
 
     @swatchRGB.setter
     def swatchRGB(self, palette):
-        # Setter method for swatchRGB
-        if self.colorGrid:
-            for row in range(len(self.colorGrid)):
-                for col in range(len(self.colorGrid[row])):
-                    self.colorGrid[row][col].importRGB(palette[row][col])
+        self.model.loadNested(palette)
 
 
 instance = Krita.instance()